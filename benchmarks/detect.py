@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import sys, os, io
+import argparse
+import contextlib
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from calibrate import detect_corners
+
+
+def run_detect(image_dir, grid_x, grid_y, use_sb_alg, jobs):
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        objpoints, imgpoints, imgsize = detect_corners(image_dir, grid_x, grid_y, 1, use_sb_alg, jobs, use_cache=False)
+    duration = time.time() - start
+
+    success = sum(1 for objects in objpoints if objects is not None)
+    return duration, success, len(objpoints)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-x', '--grid-x', help='number of internal grid corners in x dimension', type=int, default=8)
+    parser.add_argument('-y', '--grid-y', help='number of internal grid corners in y dimension', type=int, default=6)
+    parser.add_argument('-s', '--use-sb-alg', help='use the sector based algorithm to detect corners', action='store_true')
+    parser.add_argument('-j', '--jobs', help='process counts to compare against the serial path', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('image_dir', help='location of images', type=str)
+    args = parser.parse_args()
+
+    serial, success, total = run_detect(args.image_dir, args.grid_x, args.grid_y, args.use_sb_alg, 1)
+    print(f"jobs  1: {serial:0.2f}s  {total/serial:0.2f} images/s  {success}/{total} detected")
+
+    for jobs in args.jobs:
+        duration, success, total = run_detect(args.image_dir, args.grid_x, args.grid_y, args.use_sb_alg, jobs)
+        print(f"jobs {jobs:2d}: {duration:0.2f}s  {total/duration:0.2f} images/s  {success}/{total} detected  speedup {serial/duration:0.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from callib.camera import size_for_mode, maxfps_for_mode
+from callib.model import CameraModel
+from callib.dewarp import TiledRemap
+
+
+def typical_model(width, height):
+    # a wide angle lens scaled to the mode, close enough for timing
+    camera_mtx = np.array([[0.8 * width, 0, width / 2], [0, 0.8 * width, height / 2], [0, 0, 1]])
+    distortion_coeffs = np.array([[-0.3, 0.1, 0, 0, -0.02]])
+    return CameraModel(camera_mtx, distortion_coeffs, width, height)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--frames', help='number of frames to time per run', type=int, default=20)
+    parser.add_argument('-m', '--modes', help='camera modes to time', type=int, nargs='+', choices=[0, 1, 2, 3, 4, 5], default=[0, 1, 2, 3, 4, 5])
+    parser.add_argument('-j', '--threads', help='thread counts to time', type=int, nargs='+', default=None)
+    args = parser.parse_args()
+
+    threads = args.threads or sorted({1, 2, 4, os.cpu_count() or 1})
+    print(f"{os.cpu_count()} cpus")
+
+    rng = np.random.default_rng(0)
+    for mode in args.modes:
+        mode, width, height = size_for_mode(mode)
+        max_fps = maxfps_for_mode(mode)
+
+        start = time.perf_counter()
+        map1, map2 = typical_model(width, height).maps()
+        build = time.perf_counter() - start
+
+        # frames cross the bridge as BGRx
+        img = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+        out = np.empty_like(img)
+
+        print(f"mode {mode} ({width}x{height}, {max_fps} fps max): map build {1000*build:0.1f} ms")
+        for count in threads:
+            remap = TiledRemap(map1, map2, count)
+            remap.apply(img, out)
+
+            start = time.perf_counter()
+            for _ in range(args.frames):
+                remap.apply(img, out)
+            per_frame = (time.perf_counter() - start) / args.frames
+            remap.close()
+
+            fps = 1 / per_frame
+            print(f"  {count} threads: {1000*per_frame:0.1f} ms/frame  {fps:0.1f} fps  "
+                  f"{'keeps up' if fps >= max_fps else 'falls behind'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import glob
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from calibrate import detect_image
+
+
+def run_detect(images, grid_x, grid_y, use_sb_alg, scale):
+    results = []
+    durations = []
+    for fname in images:
+        start = time.time()
+        ret, corners, imgsize = detect_image(fname, grid_x, grid_y, use_sb_alg, scale)
+        durations.append(time.time() - start)
+        results.append(corners if ret else None)
+
+    return results, np.array(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-x', '--grid-x', help='number of internal grid corners in x dimension', type=int, default=8)
+    parser.add_argument('-y', '--grid-y', help='number of internal grid corners in y dimension', type=int, default=6)
+    parser.add_argument('-s', '--use-sb-alg', help='use the sector based algorithm to detect corners', action='store_true')
+    parser.add_argument('-f', '--fast-scale', help='downscale factors to compare against full resolution', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('image_dir', help='location of images', type=str)
+    args = parser.parse_args()
+
+    images = sorted(glob.glob(f'{args.image_dir}/*.jpg'))
+
+    reference, ref_durations = run_detect(images, args.grid_x, args.grid_y, args.use_sb_alg, 1)
+    ref_found = sum(1 for corners in reference if corners is not None)
+    print(f"scale 1: {1000*ref_durations.mean():0.1f} ms/image  {ref_found}/{len(images)} detected")
+
+    for scale in args.fast_scale:
+        results, durations = run_detect(images, args.grid_x, args.grid_y, args.use_sb_alg, scale)
+        found = sum(1 for corners in results if corners is not None)
+
+        # corner accuracy against the full resolution path, where both found the board
+        errors = []
+        for ref, corners in zip(reference, results):
+            if ref is None or corners is None:
+                continue
+            errors.append(np.linalg.norm((ref - corners).reshape(-1, 2), axis=1))
+        errors = np.concatenate(errors) if errors else np.zeros(1)
+
+        speedup = ref_durations.mean() / durations.mean()
+        print(f"scale {scale}: {1000*durations.mean():0.1f} ms/image  {found}/{len(images)} detected  speedup {speedup:0.2f}x  "
+              f"corner error mean {errors.mean():0.4f} px  max {errors.max():0.4f} px")
+
+
+if __name__ == "__main__":
+    main()
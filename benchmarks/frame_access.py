@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GstApp', '1.0')
+from gi.repository import Gst, GstApp
+
+import numpy as np
+
+import callib
+from callib.frames import pull_samples, mapped_frames
+
+
+def build_pipeline(width, height, fps, frames):
+    # a test source as fast as it will go, in the format the capture pipeline delivers
+    desc = (f"videotestsrc num-buffers={frames} ! video/x-raw, width={width}, height={height}, format=BGRx, framerate={fps}/1 "
+            f"! appsink name=sink sync=false max-buffers=5")
+    pipe = Gst.parse_launch(desc)
+    return pipe, pipe.get_by_name("sink")
+
+
+def extract_dup(samples, width, height):
+    for sample in samples:
+        buffer = sample.get_buffer()
+        data = buffer.extract_dup(0, buffer.get_size())
+        yield np.ndarray((height, width, 4), np.uint8, data)
+
+
+def mapped(samples, width, height):
+    for idx, buffer, image in mapped_frames(samples, width, height):
+        yield image
+
+
+def time_frames(access, width, height, fps, frames):
+    pipe, appsink = build_pipeline(width, height, fps, frames)
+    pipe.set_state(Gst.State.PLAYING)
+
+    # touch one value per frame so the access isn't optimised away
+    total, count, elapsed = 0, 0, 0.0
+    try:
+        samples = pull_samples(appsink)
+        while True:
+            try:
+                sample = next(samples)
+            except RuntimeError:
+                break
+            start = time.perf_counter()
+            for image in access(iter([sample]), width, height):
+                total += int(image[0, 0, 0])
+            elapsed += time.perf_counter() - start
+            count += 1
+    finally:
+        pipe.set_state(Gst.State.NULL)
+        pipe.get_state(Gst.CLOCK_TIME_NONE)
+
+    return elapsed / max(count, 1), count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--frames', help='number of frames per run', type=int, default=300)
+    parser.add_argument('-m', '--mode', help='the camera mode (default: 2)', choices=[0, 1, 2, 3, 4, 5], type=int, default=2)
+    args = parser.parse_args()
+
+    Gst.init(sys.argv)
+    mode, width, height = callib.size_for_mode(args.mode)
+    fps = callib.maxfps_for_mode(mode)
+
+    copy, count = time_frames(extract_dup, width, height, fps, args.frames)
+    view, count = time_frames(mapped, width, height, fps, args.frames)
+
+    frame_mb = width * height * 4 / (1024*1024)
+    print(f"mode {mode} ({width}x{height}, {frame_mb:0.1f} MB/frame), {count} frames")
+    print(f"  extract_dup: {1000*copy:0.3f} ms/frame, {frame_mb*fps:0.0f} MB/s copied at {fps} fps")
+    print(f"  mapped view: {1000*view:0.3f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
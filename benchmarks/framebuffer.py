@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import cv2
+
+import callib
+from callib.framebuffer import Framebuffer
+
+
+def write_copy(fb_file, image, fb_width, fb_height):
+    # the old preview path: letterbox into a new image then write it to the device
+    height, width = image.shape[:2]
+    if width != fb_width or height != fb_height:
+        scale = min(fb_width/width, fb_height/height)
+        new_w, new_h = int(scale*width), int(scale*height)
+        left = int((fb_width - new_w)/2)
+        right = fb_width - new_w - left
+        top = int((fb_height - new_h)/2)
+        bottom = fb_height - new_h - top
+
+        image = cv2.resize(image, (new_w, new_h))
+        image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, (0, 0, 0))
+
+    fb_file.seek(0)
+    fb_file.write(image)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--frames', help='number of frames per run', type=int, default=100)
+    parser.add_argument('--fb-size', help='framebuffer width and height', type=int, nargs=2, default=[1920, 1080])
+    parser.add_argument('-m', '--modes', help='camera modes to test', type=int, nargs='+', default=[0, 2, 4])
+    args = parser.parse_args()
+
+    # a regular file stands in for the framebuffer device
+    fb_width, fb_height = args.fb_size
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fb_path = os.path.join(tmpdir, "fb0")
+
+        with Framebuffer(fb_path, fb_width, fb_height, 32) as fb, open(fb_path, "r+b") as fb_file:
+            for mode in args.modes:
+                mode, width, height = callib.size_for_mode(mode)
+                image = np.random.randint(0, 256, (height, width, 4), np.uint8)
+
+                start = time.perf_counter()
+                for _ in range(args.frames):
+                    write_copy(fb_file, image, fb_width, fb_height)
+                copy = (time.perf_counter() - start) / args.frames
+
+                start = time.perf_counter()
+                for _ in range(args.frames):
+                    fb.write(image)
+                mapped = (time.perf_counter() - start) / args.frames
+
+                print(f"mode {mode} ({width}x{height}) -> {fb_width}x{fb_height}")
+                print(f"  letterbox + write: {1000*copy:0.2f} ms/frame")
+                print(f"  mapped framebuffer: {1000*mapped:0.2f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import subprocess
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# modules that should only be loaded when they're actually used
+HEAVY = ['cv2', 'numpy', 'jinja2', 'pkg_resources', 'gi']
+
+# modules the capture and recording tools import before the camera starts, these must stay light
+LIGHT = ['callib', 'callib.camera']
+
+
+def import_time(module):
+    # python -X importtime writes a line per module: self us | cumulative us | name
+    cmd = [sys.executable, '-X', 'importtime', '-c', f'import {module}']
+    proc = subprocess.run(cmd, cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"failed to import {module}:\n{proc.stderr}")
+
+    total = 0
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[0].strip().isdigit():
+            continue
+        cumulative, name = int(fields[1]), fields[2]
+
+        loaded.add(name.strip())
+        if name.strip() == module:
+            total = cumulative
+
+    return total, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeats', help='number of runs to take the best time from', type=int, default=5)
+    parser.add_argument('--max-ms', help='fail if an import takes longer than this', type=float, default=0)
+    parser.add_argument('modules', help='modules to time', type=str, nargs='*', default=LIGHT)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        best = None
+        for _ in range(args.repeats):
+            total, loaded = import_time(module)
+            best = total if best is None else min(best, total)
+
+        heavy = sorted(name for name in HEAVY if name in loaded)
+        print(f"{module}: {best/1000:0.1f} ms  heavy modules: {', '.join(heavy) if heavy else 'none'}")
+
+        if module in LIGHT and heavy:
+            print(f"  -> {module} should not import {', '.join(heavy)}")
+            failed = True
+        if args.max_ms > 0 and best/1000 > args.max_ms:
+            print(f"  -> {module} took longer than {args.max_ms} ms")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from callib.model import CameraModel
+
+
+def time_load(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model = fn()
+        model.maps()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--repeats', help='number of loads to average over', type=int, default=10)
+    parser.add_argument('cal_dir', help='directory with cal-raw.xml and cal-model.npz', type=str)
+    args = parser.parse_args()
+
+    calfile = os.path.join(args.cal_dir, "cal-raw.xml")
+    modelfile = os.path.join(args.cal_dir, "cal-model.npz")
+
+    xml = time_load(lambda: CameraModel.from_xml(calfile), args.repeats)
+    npz = time_load(lambda: CameraModel.load(modelfile, mmap=False), args.repeats)
+    mmap = time_load(lambda: CameraModel.load(modelfile), args.repeats)
+
+    print(f"cal-raw.xml + build maps: {1000*xml:0.2f} ms")
+    print(f"cal-model.npz:            {1000*npz:0.2f} ms")
+    print(f"cal-model.npz mmap:       {1000*mmap:0.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import importlib.util
+import json
+import resource
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GstApp', '1.0')
+from gi.repository import Gst, GstApp
+
+import callib
+from callib import sources
+from callib.instrument import Histogram
+
+
+def load_tool(name):
+    # the tools are scripts, some with names that can't be imported directly
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(ROOT, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# each builder returns the tool's pipeline and the element at the end of it, with the display sinks
+#  swapped for ones that don't need a display
+
+def capture_pipeline(mode, backend, location):
+    tool = load_tool("capture")
+    pipe, appsink, _ = tool.build_gst_pipeline(mode, False, False, 0, backend, location)
+    return pipe, appsink
+
+
+def viewer_pipeline(mode, backend, location):
+    tool = load_tool("viewer")
+    pipe = tool.build_pipeline(mode, False, False, None, backend, location, sink='fakesink')
+    # the viewer is a single chain, so its only sink is the end of it
+    sink = next(iter(pipe.iterate_sinks()), None) if pipe else None
+    return pipe, sink
+
+
+def viewer_fb_pipeline(mode, backend, location):
+    tool = load_tool("viewer-fb")
+    return tool.build_pipeline(callib.maxfps_for_mode(2), False, False, backend, location)
+
+
+def recorder_pipeline(mode, backend, location):
+    tool = load_tool("recorder")
+    mode, width, height = callib.size_for_mode(mode)
+    return tool.build_pipeline(mode, width, height, None, backend, location)
+
+
+TOOLS = {
+    'capture': capture_pipeline,
+    'viewer': viewer_pipeline,
+    'viewer-fb': viewer_fb_pipeline,
+    'recorder': recorder_pipeline,
+}
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_tool(name, mode, backend, location, frames, warmup, timeout):
+    pipe, sink = TOOLS[name](mode, backend, location)
+    if pipe is None:
+        raise RuntimeError(f"failed to build the {name} pipeline")
+
+    latency = Histogram()
+    state = {'count': 0, 'start': None, 'cpu': None, 'end': None}
+    done = threading.Event()
+
+    def frame(buffer):
+        # latency is how long since the frame was timestamped at the source, in running time
+        now = pipe.get_clock().get_time() - pipe.get_base_time()
+        state['count'] += 1
+        if state['count'] == warmup:
+            state['start'], state['cpu'] = time.perf_counter(), cpu_seconds()
+        elif state['count'] > warmup:
+            if buffer.pts != Gst.CLOCK_TIME_NONE:
+                latency.add((now - buffer.pts) / 1e6)
+            if state['count'] >= warmup + frames:
+                state['end'], state['cpu'] = time.perf_counter(), cpu_seconds() - state['cpu']
+                done.set()
+
+    pipe.set_state(Gst.State.PLAYING)
+    try:
+        deadline = time.time() + timeout
+        if isinstance(sink, GstApp.AppSink):
+            # appsinks have to be pulled from, as the tool would
+            while not done.is_set() and time.time() < deadline:
+                sample = sink.try_pull_sample(Gst.SECOND)
+                if sample is not None:
+                    frame(sample.get_buffer())
+        else:
+            pad = sink.get_static_pad("sink")
+            pad.add_probe(Gst.PadProbeType.BUFFER, lambda pad, info: frame(info.get_buffer()) or Gst.PadProbeReturn.OK)
+            done.wait(timeout)
+    finally:
+        pipe.set_state(Gst.State.NULL)
+        pipe.get_state(Gst.CLOCK_TIME_NONE)
+
+    if not done.is_set():
+        raise RuntimeError(f"{name} only delivered {state['count']} frames in {timeout} seconds")
+
+    duration = state['end'] - state['start']
+    return {
+        'fps': frames / duration,
+        'cpu_percent': 100 * state['cpu'] / duration,
+        'latency': latency.to_dict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--tools', help='tools to run', choices=list(TOOLS), nargs='+', default=list(TOOLS))
+    parser.add_argument('-m', '--modes', help='camera modes to run', type=int, nargs='+', default=[2])
+    parser.add_argument('--source', help='where the frames come from', choices=sources.BACKENDS, default='test')
+    parser.add_argument('--location', help='the image directory or pattern, or the video file, for the dir and file sources', type=str, default=None)
+    parser.add_argument('-n', '--frames', help='number of frames to time', type=int, default=300)
+    parser.add_argument('--warmup', help='number of frames to skip before timing', type=int, default=30)
+    parser.add_argument('--timeout', help='seconds to wait for the frames', type=float, default=60)
+    parser.add_argument('-o', '--output', help='save the results as json', type=str, default=None)
+    args = parser.parse_args()
+
+    Gst.init(sys.argv)
+
+    results = []
+    for mode in args.modes:
+        mode, width, height = callib.size_for_mode(mode)
+        print(f"mode {mode} ({width}x{height} at {callib.maxfps_for_mode(mode)} fps), {args.source} source")
+        for name in args.tools:
+            try:
+                result = run_tool(name, mode, args.source, args.location, args.frames, args.warmup, args.timeout)
+            except Exception as e:
+                print(f"  {name:>10}: failed: {e}")
+                continue
+
+            lat = result['latency']
+            print(f"  {name:>10}: {result['fps']:6.1f} fps, cpu {result['cpu_percent']:5.0f}%, "
+                  f"latency mean {lat['mean_ms']:0.1f} ms, p95 {lat['p95_ms']:0.1f} ms")
+            results.append(dict(result, tool=name, mode=mode, source=args.source))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import callib
+from callib.framebuffer import Framebuffer, letterbox
+from capture import build_gst_pipeline, camera, preview, Preview, Gst
+
+
+def run_mode(mode, fb, preview_fps, branch, seconds):
+    _, width, height = callib.size_for_mode(mode)
+    _, _, preview_width, preview_height = letterbox(width, height, fb.width, fb.height)
+    preview_size = (preview_width, preview_height) if branch else None
+
+    # the test source at the camera mode's size and rate stands in for the camera
+    gpipe, appsink, preview_sink = build_gst_pipeline(mode, False, False, backend='test',
+                                                      preview_size=preview_size, preview_fps=preview_fps)
+    viewer = Preview(fb, preview_fps, preview_sink, preview_size)
+
+    stop = threading.Event()
+    stats = {}
+    pipe = camera(appsink, mode, stop, stats)
+    if preview_sink is None:
+        pipe = preview(pipe, viewer)
+
+    preview_thread = threading.Thread(target=viewer.run, args=(stop,))
+    gpipe.set_state(Gst.State.PLAYING)
+    preview_thread.start()
+    try:
+        start = time.perf_counter()
+        for item in pipe:
+            if time.perf_counter() - start > seconds:
+                break
+    finally:
+        stop.set()
+        preview_thread.join()
+        gpipe.set_state(Gst.State.NULL)
+        gpipe.get_state(Gst.CLOCK_TIME_NONE)
+
+    frames = stats.get('frames', 0)
+    duration = stats['end'] - stats['start'] if frames > 1 else 0
+    capture_fps = (frames - 1) / duration if duration > 0 else 0
+
+    return capture_fps, viewer.report(), preview_sink is not None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--modes', help='camera modes to test', type=int, nargs='+', default=[0, 1, 2, 3, 4, 5])
+    parser.add_argument('-t', '--seconds', help='seconds to run each mode for', type=float, default=10)
+    parser.add_argument('--preview-fps', help='target preview frame rate', type=int, default=15)
+    parser.add_argument('--fb-size', help='framebuffer width and height', type=int, nargs=2, default=[1920, 1080])
+    args = parser.parse_args()
+
+    Gst.init(sys.argv)
+
+    # a regular file stands in for the framebuffer device
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fb_width, fb_height = args.fb_size
+        with Framebuffer(os.path.join(tmpdir, "fb0"), fb_width, fb_height, 32) as fb:
+            for mode in args.modes:
+                mode, width, height = callib.size_for_mode(mode)
+                print(f"mode {mode} ({width}x{height} at {callib.maxfps_for_mode(mode)} fps)")
+                for branch in [False, True]:
+                    capture_fps, report, used_branch = run_mode(mode, fb, args.preview_fps, branch, args.seconds)
+                    label = "pipeline branch" if used_branch else "cpu preview"
+                    print(f"  {label:>15}: capture {capture_fps:0.1f} fps, preview {report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import importlib.util
+import resource
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+import callib
+from callib import sources
+
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_recorder(recorder, mode, backend, location, num_images, delay, gate):
+    mode, width, height = callib.size_for_mode(mode)
+    pipe, sink = recorder.build_pipeline(mode, width, height, None, backend, location)
+
+    with tempfile.TemporaryDirectory() as capture_dir:
+        start, cpu = time.perf_counter(), cpu_seconds()
+        tracker = recorder.run(pipe, sink, capture_dir, num_images, delay, gate)
+        duration, cpu = time.perf_counter() - start, cpu_seconds() - cpu
+
+    return tracker, duration, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--modes', help='camera modes to run', type=int, nargs='+', default=[2])
+    parser.add_argument('--source', help='where the frames come from', choices=sources.BACKENDS, default='test')
+    parser.add_argument('--location', help='the image directory or pattern, or the video file, for the dir and file sources', type=str, default=None)
+    parser.add_argument('-n', '--num-images', help='number of images to save per run', type=int, default=3)
+    parser.add_argument('-t', '--time-delay', help='seconds between images', type=int, default=5)
+    args = parser.parse_args()
+
+    Gst.init(sys.argv)
+
+    spec = importlib.util.spec_from_file_location("recorder", os.path.join(ROOT, "recorder.py"))
+    recorder = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(recorder)
+
+    for mode in args.modes:
+        mode, width, height = callib.size_for_mode(mode)
+        print(f"mode {mode} ({width}x{height} at {callib.maxfps_for_mode(mode)} fps), {args.source} source, "
+              f"{args.num_images} images {args.time_delay} seconds apart")
+
+        for gate in [False, True]:
+            tracker, duration, cpu = run_recorder(recorder, mode, args.source, args.location,
+                                                  args.num_images, args.time_delay, gate)
+            label = "gated" if gate else "every frame"
+            print(f"\n  {label:>11}: {tracker['encoded']} frames encoded for {tracker['count']} saved, "
+                  f"cpu {100*cpu/duration:0.0f}% over {duration:0.1f} s")
+
+
+if __name__ == "__main__":
+    main()
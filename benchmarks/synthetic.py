@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+import sys, os, io
+import argparse
+import contextlib
+import json
+import platform
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import cv2
+
+from callib.camera import size_for_mode
+from callib.detect import find_corners, search_coarse, refine_coarse
+from calibrate import object_points, calibrate
+
+
+# ground truth for mode 2, scaled to the other modes
+TRUE_FOCAL = 1590.0 / 1920
+TRUE_DIST = np.array([-0.356, 0.199, -0.002, -0.002, -0.075])
+
+
+def true_camera(width, height):
+    f = TRUE_FOCAL * width
+    return np.array([[f, 0, width/2 + 0.01*width], [0, f, height/2 - 0.01*height], [0, 0, 1]])
+
+
+def make_board(grid_x, grid_y, square):
+    # a white margin of one square around the (grid_x+1) x (grid_y+1) squares
+    board = np.full(((grid_y + 3) * square, (grid_x + 3) * square), 255, np.uint8)
+    for j in range(grid_y + 1):
+        for i in range(grid_x + 1):
+            if (i + j) % 2 == 0:
+                board[(j+1)*square:(j+2)*square, (i+1)*square:(i+2)*square] = 0
+    return board
+
+
+def random_pose(rng, grid_x, grid_y, camera_mtx, width):
+    # board units are squares; pick a distance where the board fills 40-70% of the image width
+    rvec = rng.uniform(-0.5, 0.5, 3)
+    fill = rng.uniform(0.4, 0.7)
+    z = camera_mtx[0, 0] * (grid_x + 3) / (fill * width)
+
+    R, _ = cv2.Rodrigues(rvec)
+    centre = np.array([(grid_x + 3) / 2, (grid_y + 3) / 2, 0])
+    tvec = -R @ centre + np.array([rng.uniform(-0.15, 0.15) * z, rng.uniform(-0.1, 0.1) * z, z])
+
+    return rvec, tvec
+
+
+def render(board, rays, square, rvec, tvec, width, height):
+    # intersect each pixel's ray with the board plane and sample the board there
+    R, _ = cv2.Rodrigues(rvec)
+    normal = R[:, 2]
+    depth = (normal @ tvec) / (rays @ normal)
+    points = (rays * depth[:, None] - tvec) @ R
+
+    mapx = (points[:, 0] * square - 0.5).reshape(height, width).astype(np.float32)
+    mapy = (points[:, 1] * square - 0.5).reshape(height, width).astype(np.float32)
+    return cv2.remap(board, mapx, mapy, cv2.INTER_LINEAR, borderValue=128)
+
+
+def pixel_rays(camera_mtx, dist, width, height):
+    # the undistorted ray for each pixel, the same for every pose
+    xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    pixels = np.stack([xs.ravel(), ys.ravel()], axis=1).reshape(-1, 1, 2)
+    normalised = cv2.undistortPoints(pixels, camera_mtx, dist).reshape(-1, 2)
+    return np.concatenate([normalised, np.ones((len(normalised), 1), np.float32)], axis=1)
+
+
+def render_set(rng, mode, grid_x, grid_y, poses, noise, quality):
+    mode, width, height = size_for_mode(mode)
+    camera_mtx = true_camera(width, height)
+
+    square = 64
+    board = make_board(grid_x, grid_y, square)
+    rays = pixel_rays(camera_mtx, TRUE_DIST, width, height)
+
+    # the board's internal corners in board units
+    corners3d = object_points(grid_x, grid_y, 1) + np.array([2, 2, 0], np.float32)
+
+    images = []
+    for _ in range(poses):
+        rvec, tvec = random_pose(rng, grid_x, grid_y, camera_mtx, width)
+        img = render(board, rays, square, rvec, tvec, width, height).astype(np.float32)
+        img = np.clip(img + rng.normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+
+        ret, jpeg = cv2.imencode(".jpg", cv2.cvtColor(img, cv2.COLOR_GRAY2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        truth, _ = cv2.projectPoints(corners3d, rvec, tvec, camera_mtx, TRUE_DIST)
+        images.append((jpeg, truth.reshape(-1, 2)))
+
+    return images, camera_mtx, (height, width)
+
+
+# the same reduced decodes as the coarse search in calibrate.py
+REDUCED = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+
+def detect(jpeg, grid_x, grid_y, use_sb_alg, scale, timings):
+    # times the detection code the calibration uses. at full scale the subpixel refinement is part of
+    #  find_corners so it's counted in detect
+    start = time.perf_counter()
+    if scale == 1:
+        gray = cv2.imdecode(jpeg, cv2.IMREAD_GRAYSCALE)
+    else:
+        gray = cv2.imdecode(jpeg, REDUCED[scale])
+    timings['decode'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    if scale == 1:
+        ret, corners = find_corners(gray, grid_x, grid_y, use_sb_alg)
+    else:
+        ret, corners = search_coarse(gray, grid_x, grid_y, use_sb_alg)
+    timings['detect'] += time.perf_counter() - start
+    if not ret or scale == 1:
+        return ret, corners, gray.shape
+
+    start = time.perf_counter()
+    gray = cv2.imdecode(jpeg, cv2.IMREAD_GRAYSCALE)
+    timings['decode'] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    corners = refine_coarse(gray, corners, scale)
+    timings['subpixel'] += time.perf_counter() - start
+
+    return ret, corners, gray.shape
+
+
+def run_pipeline(images, grid_x, grid_y, use_sb_alg=False, scale=1):
+    timings = {'decode': 0.0, 'detect': 0.0, 'subpixel': 0.0, 'solve': 0.0}
+
+    objp = object_points(grid_x, grid_y, 1)
+    objpoints, imgpoints, corner_errors = [], [], []
+    imgsize = None
+
+    for jpeg, truth in images:
+        ret, corners, size = detect(jpeg, grid_x, grid_y, use_sb_alg, scale, timings)
+        if not ret:
+            continue
+        imgsize = size
+
+        # the board can be detected in either direction
+        found = corners.reshape(-1, 2)
+        error = min(np.linalg.norm(found - truth, axis=1).mean(), np.linalg.norm(found[::-1] - truth, axis=1).mean())
+        corner_errors.append(error)
+
+        objpoints.append(objp)
+        imgpoints.append(corners)
+
+    results = None
+    if len(objpoints) >= 3:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = calibrate(objpoints, imgpoints, imgsize)
+        timings['solve'] = time.perf_counter() - start
+
+    return results, timings, len(objpoints), float(np.mean(corner_errors)) if corner_errors else None
+
+
+def param_errors(results, camera_mtx):
+    mtx, dist = results['camera_mtx'], results['distortion_coeffs'].ravel()[:5]
+    return {
+        'fx_rel': float(abs(mtx[0, 0] - camera_mtx[0, 0]) / camera_mtx[0, 0]),
+        'fy_rel': float(abs(mtx[1, 1] - camera_mtx[1, 1]) / camera_mtx[1, 1]),
+        'cx_px': float(abs(mtx[0, 2] - camera_mtx[0, 2])),
+        'cy_px': float(abs(mtx[1, 2] - camera_mtx[1, 2])),
+        'dist_abs': [float(v) for v in np.abs(dist - TRUE_DIST)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-x', '--grid-x', help='number of internal grid corners in x dimension', type=int, default=8)
+    parser.add_argument('-y', '--grid-y', help='number of internal grid corners in y dimension', type=int, default=6)
+    parser.add_argument('-m', '--modes', help='camera modes to benchmark', type=int, nargs='+', choices=[0, 1, 2, 3, 4, 5], default=[0, 1, 2, 3, 4])
+    parser.add_argument('-p', '--poses', help='number of board poses per mode', type=int, default=20)
+    parser.add_argument('-n', '--noise', help='gaussian noise levels (std dev in grey levels)', type=float, nargs='+', default=[0, 2, 5])
+    parser.add_argument('-q', '--quality', help='jpeg quality of the rendered images', type=int, default=95)
+    parser.add_argument('-s', '--sb', help='use the sector based algorithm to detect corners', action='store_true')
+    parser.add_argument('-f', '--fast-scale', help='find corners on an image downscaled by this factor then refine at full resolution', choices=[1, 2, 4, 8], type=int, default=1)
+    parser.add_argument('--seed', help='random seed for the board poses and noise', type=int, default=0)
+    parser.add_argument('-o', '--output', help='file to write the json results to', type=str, default=None)
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'grid': [args.grid_x, args.grid_y],
+        'poses': args.poses,
+        'sb': args.sb,
+        'fast_scale': args.fast_scale,
+        'seed': args.seed,
+        'runs': [],
+    }
+
+    for mode in args.modes:
+        for noise in args.noise:
+            rng = np.random.default_rng(args.seed)
+            images, camera_mtx, (height, width) = render_set(rng, mode, args.grid_x, args.grid_y, args.poses, noise, args.quality)
+            results, timings, detected, corner_error = run_pipeline(images, args.grid_x, args.grid_y, args.sb, args.fast_scale)
+
+            run = {
+                'mode': mode,
+                'width': width,
+                'height': height,
+                'noise': noise,
+                'images': len(images),
+                'detected': detected,
+                'timings_ms': {stage: 1000 * value for stage, value in timings.items()},
+                'corner_error_px': corner_error,
+                'rms': None if results is None else float(results['rms']),
+                'errors': None if results is None else param_errors(results, camera_mtx),
+            }
+            report['runs'].append(run)
+
+            per_image = " ".join(f"{stage} {1000*timings[stage]/len(images):0.1f}" for stage in ['decode', 'detect', 'subpixel'])
+            summary = f"mode {mode} noise {noise:g}: {detected}/{len(images)} detected  ms/image: {per_image}  solve {1000*timings['solve']:0.1f} ms"
+            if results is not None:
+                errors = run['errors']
+                summary += f"  fx err {100*errors['fx_rel']:0.3f}%  cx err {errors['cx_px']:0.2f}px  corner err {corner_error:0.3f}px"
+            print(summary, flush=True)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import cv2
+
+from callib.camera import size_for_mode
+from callib.undistort import load_calibration, build_maps, undistort
+
+
+def scaled_calibration(camera_mtx, distortion_coeffs, width, height):
+    # a calibration for one mode is scaled to the other modes, close enough for timing
+    mtx = camera_mtx.copy()
+    scale = width / (2 * camera_mtx[0, 2])
+    mtx[:2] *= scale
+    mtx[1, 2] = height / 2
+    return mtx, distortion_coeffs
+
+
+def time_frames(fn, frames):
+    start = time.time()
+    for _ in range(frames):
+        fn()
+    return (time.time() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--frames', help='number of frames to time per mode', type=int, default=20)
+    parser.add_argument('-m', '--modes', help='camera modes to time', type=int, nargs='+', choices=[0, 1, 2, 3, 4, 5], default=[0, 1, 2, 3, 4])
+    parser.add_argument('calfile', help='calibration file (cal-raw.xml), a typical calibration is used if not given', type=str, nargs='?', default=None)
+    args = parser.parse_args()
+
+    if args.calfile is not None:
+        camera_mtx, distortion_coeffs = load_calibration(args.calfile)
+    else:
+        camera_mtx = np.array([[1590.0, 0, 960], [0, 1590.0, 540], [0, 0, 1]])
+        distortion_coeffs = np.array([[-0.356, 0.199, -0.002, -0.002, -0.075]])
+
+    rng = np.random.default_rng(0)
+    for mode in args.modes:
+        mode, width, height = size_for_mode(mode)
+        mtx, dist = scaled_calibration(camera_mtx, distortion_coeffs, width, height)
+        optimal_mtx, roi = cv2.getOptimalNewCameraMatrix(mtx, dist, (width, height), 0, (width, height))
+
+        img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+        start = time.time()
+        map1, map2 = build_maps(mtx, dist, optimal_mtx, (height, width))
+        build = time.time() - start
+
+        before = time_frames(lambda: cv2.undistort(img, mtx, dist, None, optimal_mtx), args.frames)
+        after = time_frames(lambda: undistort(img, map1, map2), args.frames)
+
+        print(f"mode {mode} ({width}x{height}): undistort {1000*before:0.1f} ms/frame  "
+              f"remap {1000*after:0.1f} ms/frame  speedup {before/after:0.2f}x  map build {1000*build:0.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,313 @@
 #!/usr/bin/env python3
-import sys, time
+import sys, io, time
+import contextlib
 import argparse
-import os.path, glob
-import pkg_resources
+import os.path
 import configparser
+import multiprocessing
+import collections
 
 import numpy as np
 import cv2
 
-from jinja2 import Template
-
+import callib
 from callib import display, display_sbs
+from callib.images import ImageStore, VideoStore
+from callib.undistort import build_maps, undistort
+from callib.model import CameraModel
+from callib.selection import select_views
+from callib.cache import hash_file, cache_key, load_cache, save_cache
+from callib.detect import find_corners, search_coarse, refine_coarse
+
+
+def find_corners_coarse(fname, grid_x, grid_y, use_sb_alg, scale):
+    # decode straight to grayscale at reduced scale - the jpeg decoder does the downscaling
+    flags = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+    small = cv2.imread(fname, flags[scale])
+
+    ret, corners = search_coarse(small, grid_x, grid_y, use_sb_alg)
+    if not ret:
+        # the full image isn't decoded so the size is only approximate, rounded up by the decoder
+        h, w = small.shape
+        return ret, None, (h * scale, w * scale)
+    
+    gray = cv2.imread(fname, cv2.IMREAD_GRAYSCALE)
+    corners = refine_coarse(gray, corners, scale)
+    
+    return ret, corners, gray.shape
+
+
+def detect_image(fname, grid_x, grid_y, use_sb_alg, scale=1):
+    if scale > 1:
+        return find_corners_coarse(fname, grid_x, grid_y, use_sb_alg, scale)
+
+    img = cv2.imread(fname)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    
+    ret, corners = find_corners(gray, grid_x, grid_y, use_sb_alg)
+    return ret, corners, gray.shape
+
+
+def detect_frame(gray, grid_x, grid_y, use_sb_alg, scale=1):
+    # same as detect_image for a frame that's already decoded
+    if scale == 1:
+        return find_corners(gray, grid_x, grid_y, use_sb_alg) + (gray.shape,)
+    
+    h, w = gray.shape
+    small = cv2.resize(gray, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+    ret, corners = search_coarse(small, grid_x, grid_y, use_sb_alg)
+    if not ret:
+        return ret, None, gray.shape
+    
+    return ret, refine_coarse(gray, corners, scale), gray.shape
+
+
+def _init_worker():
+    # each worker process gets one core; stop opencv from also spawning threads
+    cv2.setNumThreads(1)
+
+
+def _detect_image(task):
+    return detect_image(*task)
+
+
+def detect_images(images, grid_x, grid_y, use_sb_alg, jobs=1, store=None, scale=1):
+    if jobs <= 1:
+        for fname in images:
+            # the coarse search decodes at reduced scale so doesn't go through the store
+            if store is None or scale > 1:
+                yield (fname,) + detect_image(fname, grid_x, grid_y, use_sb_alg, scale)
+                continue
+            # decode through the store so later stages can reuse the image
+            gray = store.gray(fname)
+            yield (fname,) + find_corners(gray, grid_x, grid_y, use_sb_alg) + (gray.shape,)
+        return
+    
+    tasks = [(fname, grid_x, grid_y, use_sb_alg, scale) for fname in images]
+    
+    # imap hands back the results in submission order so the sorted order is kept
+    with multiprocessing.Pool(jobs, initializer=_init_worker) as pool:
+        for fname, result in zip(images, pool.imap(_detect_image, tasks)):
+            yield (fname,) + result
+
+
+def _detect_frame(task):
+    return detect_frame(*task)
+
+
+def detect_video(store, grid_x, grid_y, use_sb_alg, jobs=1, scale=1):
+    frames = ((name, cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)) for name, img in store.frames())
+    
+    if jobs <= 1:
+        for name, gray in frames:
+            yield (name,) + detect_frame(gray, grid_x, grid_y, use_sb_alg, scale)
+        return
+    
+    # only a couple of frames per worker are in flight so memory use stays bounded
+    with multiprocessing.Pool(jobs, initializer=_init_worker) as pool:
+        pending = collections.deque()
+        for name, gray in frames:
+            pending.append((name, pool.apply_async(_detect_frame, ((gray, grid_x, grid_y, use_sb_alg, scale),))))
+            if len(pending) >= 2 * jobs:
+                name, result = pending.popleft()
+                yield (name,) + result.get()
+        
+        while len(pending) > 0:
+            name, result = pending.popleft()
+            yield (name,) + result.get()
 
 
-def detect_corners(image_dir, grid_x, grid_y, grid_size, use_sb_alg):
+def object_points(grid_x, grid_y, grid_size):
     # array with 3d coordinates of the grid corners in world space
     objp = np.zeros((grid_x * grid_y, 3), np.float32)
     objp[:,:2] = np.mgrid[0:grid_x, 0:grid_y].T.reshape(-1,2) * grid_size
+    return objp
+
+
+def generate_corners(image_dir, grid_x, grid_y, use_sb_alg, jobs=1, use_cache=True, store=None, scale=1):
+    # video sources are streamed through detection and not cached
+    if isinstance(store, VideoStore):
+        for name, ret, corners, imgsize in detect_video(store, grid_x, grid_y, use_sb_alg, jobs, scale):
+            print(f"processing {name}: {'success' if ret else 'failed'}", flush=True)
+            yield name, ret, corners, imgsize
+        return
+    
+    # the images to process
+    if store is None:
+        store = ImageStore(image_dir)
+    images = store.files
+    
+    # load cached results and find the images that need detecting
+    cachefile = os.path.join(image_dir, "cal-corners.npz")
+    cache = load_cache(cachefile) if use_cache else {}
+    
+    digests = [hash_file(fname) for fname in images] if use_cache else [None] * len(images)
+    keys = [cache_key(digest, grid_x, grid_y, use_sb_alg, scale) for digest in digests]
+    pending = [fname for fname, key in zip(images, keys) if key not in cache]
+    
+    # detection is lazy so the consumer can stop early
+    detector = detect_images(pending, grid_x, grid_y, use_sb_alg, jobs, store, scale)
+    pending = set(pending)
+    ndetected = 0
+    
+    try:
+        # yield the results in sorted order
+        for fname, key in zip(images, keys):
+            if fname in pending:
+                _, ret, corners, imgsize = next(detector)
+                cache[key] = (ret, corners, imgsize)
+                ndetected += 1
+                status = ""
+            else:
+                ret, corners, imgsize = cache[key]
+                status = " (cached)"
+            
+            print(f"processing {fname}: {'success' if ret else 'failed'}{status}", flush=True)
+            yield fname, ret, corners, imgsize
+    
+    finally:
+        detector.close()
+        
+        # save the cache, dropping entries for images no longer in the directory
+        if use_cache:
+            current = set(digests)
+            kept = {key: value for key, value in cache.items() if key.split("-")[0] in current}
+            if ndetected > 0 or len(kept) != len(cache):
+                save_cache(cachefile, kept)
+
+
+def detect_corners(image_dir, grid_x, grid_y, grid_size, use_sb_alg, jobs=1, use_cache=True, store=None, scale=1):
+    objp = object_points(grid_x, grid_y, grid_size)
 
     # arrays to store object and image coordinates of the corners for each image
     objpoints = []
     imgpoints = []
+    imgsize = None
 
-    # process the images
-    images = glob.glob(f'{image_dir}/*.jpg')
-    images.sort()
-    for fname in images:
-        print(f"processing {fname}: ", end="")
-    
-        img = cv2.imread(fname)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-        imgsize = gray.shape
+    for fname, ret, corners, size in generate_corners(image_dir, grid_x, grid_y, use_sb_alg, jobs, use_cache, store, scale):
+        imgpoints.append(corners)
+        objpoints.append(objp if ret else None)
+        # a failed coarse detection only knows the approximate size
+        if ret:
+            imgsize = size
         
-        if use_sb_alg:
-            ret, corners = cv2.findChessboardCornersSB(gray, (grid_x, grid_y))
-        else:
-            ret, corners = cv2.findChessboardCorners(gray, (grid_x, grid_y))
-            if ret:
-                criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 300, 0.000001)
-                corners = cv2.cornerSubPix(gray,corners, (11,11), (-1,-1), criteria)
+    return (objpoints, imgpoints, imgsize)
+
+
+def param_change(mtx0, dist0, mtx1, dist1):
+    # relative change in focal length and principal point, absolute change in the distortion
+    intrinsics0 = np.array([mtx0[0,0], mtx0[1,1], mtx0[0,2], mtx0[1,2]])
+    intrinsics1 = np.array([mtx1[0,0], mtx1[1,1], mtx1[0,2], mtx1[1,2]])
+    
+    intrinsics = np.max(np.abs(intrinsics1 - intrinsics0) / np.abs(intrinsics0))
+    distortion = np.max(np.abs(dist1 - dist0))
+    
+    return max(intrinsics, distortion)
 
-        print("success" if ret else "failed")
 
+def detect_corners_streaming(image_dir, grid_x, grid_y, grid_size, use_sb_alg, jobs=1, use_cache=True, store=None, scale=1,
+                                solve_every=5, tolerance=0.005):
+    objp = object_points(grid_x, grid_y, grid_size)
+
+    # arrays to store object and image coordinates of the corners for each image
+    objpoints = []
+    imgpoints = []
+    
+    # the successful detections and the running calibration
+    nobjpoints = []
+    nimgpoints = []
+    mtx, dist = None, None
+    
+    if store is None:
+        store = ImageStore(image_dir)
+    
+    imgsize = None
+    results = generate_corners(image_dir, grid_x, grid_y, use_sb_alg, jobs, use_cache, store, scale)
+    for fname, ret, corners, size in results:
         imgpoints.append(corners)
         objpoints.append(objp if ret else None)
+        # a failed coarse detection only knows the approximate size
+        if not ret:
+            continue
+        imgsize = size
+        
+        nobjpoints.append(objp)
+        nimgpoints.append(corners)
+        
+        # re-solve every few detections, starting from the previous solution
+        nsolved = len(nobjpoints)
+        if nsolved < 3 or nsolved % solve_every != 0:
+            continue
+        
+        h, w = imgsize
+        # the initial guess is updated in place, so hand over copies to compare against
+        if mtx is None:
+            rms, nmtx, ndist, _, _ = cv2.calibrateCamera(nobjpoints, nimgpoints, (w, h), None, None)
+        else:
+            rms, nmtx, ndist, _, _ = cv2.calibrateCamera(nobjpoints, nimgpoints, (w, h), mtx.copy(), dist.copy(), 
+                                                            flags=cv2.CALIB_USE_INTRINSIC_GUESS)
+        
+        change = None if mtx is None else param_change(mtx, dist, nmtx, ndist)
+        mtx, dist = nmtx, ndist
+        
+        if change is None:
+            print(f"solved with {nsolved} views: rms {rms:0.4f}")
+            continue
+        print(f"solved with {nsolved} views: rms {rms:0.4f} change {change:0.6f}")
+        
+        if change < tolerance:
+            break
+    
+    results.close()
+    
+    # a video's length isn't known until it's been read to the end
+    if isinstance(store, VideoStore):
+        print(f"used {len(objpoints)} frames ({len(nobjpoints)} views)")
+    else:
+        print(f"used {len(objpoints)} of {len(store.files)} images ({len(nobjpoints)} views)")
         
     return (objpoints, imgpoints, imgsize)
 
 
+def select_subset(objpoints, imgpoints, imgsize, grid_x, grid_y, max_views):
+    # keep the successful detections that add the most coverage and pose diversity
+    views = [idx for idx, objects in enumerate(objpoints) if objects is not None]
+    selected = select_views([imgpoints[idx] for idx in views], grid_x, grid_y, imgsize, max_views)
+    keep = set(views[idx] for idx in selected)
+    
+    print(f"selected {len(keep)} of {len(views)} views")
+    
+    return [objects if idx in keep else None for idx, objects in enumerate(objpoints)]
+
+
+def reprojection_error(objpoints, imgpoints, calib_results):
+    mtx, dist = calib_results['camera_mtx'], calib_results['distortion_coeffs']
+    
+    # rms error over every view, fitting each board pose to the given intrinsics
+    sq_error, npoints = 0.0, 0
+    for corners, objects in zip(imgpoints, objpoints):
+        if objects is None:
+            continue
+        ret, rvec, tvec = cv2.solvePnP(objects, corners, mtx, dist)
+        projected, _ = cv2.projectPoints(objects, rvec, tvec, mtx, dist)
+        sq_error += np.sum((projected.reshape(-1,2) - corners.reshape(-1,2))**2)
+        npoints += len(objects)
+    
+    return np.sqrt(sq_error / npoints)
+
+
+def compare_subset(objpoints, subset_objpoints, imgpoints, imgsize):
+    for label, objects in [("full", objpoints), ("subset", subset_objpoints)]:
+        start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = calibrate(objects, imgpoints, imgsize)
+        duration = time.time() - start
+        
+        nviews = sum(1 for obj in objects if obj is not None)
+        error = reprojection_error(objpoints, imgpoints, results)
+        print(f"{label}: {nviews} views, {duration:0.2f}s, rms {results['rms']:0.4f}, rms over all views {error:0.4f}")
+
+
 def calibrate(objpoints, imgpoints, imgsize):
     print("calibrating...")
     
@@ -78,18 +337,19 @@ def calibrate(objpoints, imgpoints, imgsize):
         'rvecs': rvecs,
         'tvecs': tvecs,
         'optimal_camera_mtx': optimal_cameramtx,
-        'roi': roi
+        'roi': roi,
+        'rms': ret,
     }
     return results
 
 
-def display_corners(image_dir, grid_x, grid_y, objpoints, imgpoints, imgsize):
-    images = glob.glob(f'{image_dir}/*.jpg')
-    images.sort()
-    for fname, corners, objects in zip(images, imgpoints, objpoints):
+def display_corners(image_dir, grid_x, grid_y, objpoints, imgpoints, imgsize, store=None):
+    if store is None:
+        store = ImageStore(image_dir)
+    for fname, corners, objects in zip(store.files, imgpoints, objpoints):
         print(f"displaying {fname}")
 
-        img = cv2.imread(fname)
+        img = store.color(fname).copy()
 
         cv2.drawChessboardCorners(img, (grid_x, grid_y), corners, False if objects is None else True)
         k = display("corners", img, 2)
@@ -98,19 +358,27 @@ def display_corners(image_dir, grid_x, grid_y, objpoints, imgpoints, imgsize):
         
 
 
-def display_undistorted(image_dir, imgsize, calib_results):
-    roi = calib_results['roi']
-    mtx, optimal_mtx = calib_results['camera_mtx'], calib_results['optimal_camera_mtx']
-    dist = calib_results['distortion_coeffs']
+def undistort_maps(imgsize, calib_results):
+    # the maps only depend on the calibration, so they're built once and kept with the results
+    if 'undistort_maps' not in calib_results:
+        mtx, optimal_mtx = calib_results['camera_mtx'], calib_results['optimal_camera_mtx']
+        dist = calib_results['distortion_coeffs']
+        calib_results['undistort_maps'] = build_maps(mtx, dist, optimal_mtx, imgsize)
+
+    return calib_results['undistort_maps']
+
+
+def display_undistorted(image_dir, imgsize, calib_results, store=None):
+    map1, map2 = undistort_maps(imgsize, calib_results)
 
     # load, undistort, and display images
-    images = glob.glob(f'{image_dir}/*.jpg')
-    images.sort()
-    for fname in images:
+    if store is None:
+        store = ImageStore(image_dir)
+    for fname in store.files:
         print(f"displaying {fname}")
 
-        img = cv2.imread(fname)
-        dst = cv2.undistort(img, mtx, dist, None, optimal_mtx)
+        img = store.color(fname)
+        dst = undistort(img, map1, map2)
         
         k = display_sbs("comparison", img, dst, 2)
         if k != -1 and k == ord('q'):
@@ -139,10 +407,20 @@ def save_results(image_dir, imgsize, calib_results):
     else:
         camera_mode = 2
     
+    # save the binary camera model with the undistortion maps so they don't need to be regenerated
+    height, width = imgsize
+    map1, map2 = undistort_maps(imgsize, calib_results)
+    model = CameraModel(camera_mtx, distortion_coeffs, width, height, int(camera_mode), 
+                            calib_results['optimal_camera_mtx'], map1, map2)
+    model.save(os.path.join(image_dir, "cal-model.npz"))
         
     # save the calibration config
-    template_str = pkg_resources.resource_string('callib', 'config.tpl').decode('utf-8')
-    template = Template(template_str)
+    # jinja is only needed here, so it's not imported until the end of the run
+    from jinja2 import Template
+    
+    template_file = os.path.join(os.path.dirname(callib.__file__), 'config.tpl')
+    with open(template_file) as f:
+        template = Template(f.read())
     
     height, width = imgsize
     fx, fy, cx, cy = camera_mtx[0,0], camera_mtx[1,1], camera_mtx[0,2], camera_mtx[1,2]
@@ -175,23 +453,64 @@ def main():
     parser.add_argument('-y', '--grid-y', help='number of internal grid corners in y dimension', type=int, default=6)
     parser.add_argument('-g', '--grid-size', help='size of the grid squares in real-world units', type=int, default=1)
     parser.add_argument('-s', '--use-sb-alg', help='use the sector based algorithm to detect corners', action='store_true')
+    parser.add_argument('-f', '--fast-scale', help='find corners on an image downscaled by this factor then refine at full resolution', choices=[1, 2, 4, 8], type=int, default=1)
+    parser.add_argument('-j', '--jobs', help='number of processes to use for corner detection', type=int, default=1)
+    parser.add_argument('--no-cache', help='ignore and do not update the corner detection cache', action='store_true')
+    parser.add_argument('-m', '--max-cache-mb', help='memory limit in MB for decoded images shared between stages', type=int, default=512)
+    parser.add_argument('--stream', help='calibrate as images are processed and stop once the parameters converge', action='store_true')
+    parser.add_argument('--stream-every', help='number of new views between re-solves in streaming mode', type=int, default=5)
+    parser.add_argument('--stream-tol', help='largest parameter change to accept as converged in streaming mode', type=float, default=0.005)
+    parser.add_argument('--max-views', help='calibrate with at most this many views, chosen for coverage and pose diversity', type=int, default=0)
+    parser.add_argument('--compare-subset', help='report calibration time and error for the selected views against all views', action='store_true')
+    parser.add_argument('--frame-step', help='use every n-th frame when reading from a video', type=int, default=15)
+    parser.add_argument('--max-frames', help='maximum number of frames to use from a video (0 for all)', type=int, default=0)
+    parser.add_argument('-o', '--output-dir', help='where to save the results (default: the image directory or the video\'s directory)', type=str, default=None)
     parser.add_argument('-d', '--display', help='display results of processing', action='store_true')
-    parser.add_argument('image_dir', help='location of images', type=str)
+    parser.add_argument('image_dir', help='location of images, or a video file or stream', type=str)
 
     args = parser.parse_args()
+    if args.stream_every < 1:
+        parser.error("--stream-every must be at least 1")
+    if args.stream_tol <= 0:
+        parser.error("--stream-tol must be greater than 0")
+
+    if os.path.isdir(args.image_dir):
+        # the images are listed once, and the decoded images are only kept for the display stages to reuse
+        store = ImageStore(args.image_dir, max_mbytes=args.max_cache_mb if args.display else 0)
+        output_dir = args.image_dir
+    else:
+        # frames are streamed from the video, only a few are held in memory at a time
+        store = VideoStore(args.image_dir, args.frame_step, args.max_frames)
+        output_dir = os.path.dirname(args.image_dir) if os.path.isfile(args.image_dir) else "."
+    
+    if args.output_dir is not None:
+        output_dir = args.output_dir
 
     # detect the corners in the images
-    objpoints, imgpoints, imgsize = detect_corners(args.image_dir, args.grid_x, args.grid_y, args.grid_size, args.use_sb_alg)
+    if args.stream:
+        objpoints, imgpoints, imgsize = detect_corners_streaming(args.image_dir, args.grid_x, args.grid_y, args.grid_size, args.use_sb_alg, 
+                                                                    args.jobs, not args.no_cache, store, args.fast_scale, args.stream_every, args.stream_tol)
+    else:
+        objpoints, imgpoints, imgsize = detect_corners(args.image_dir, args.grid_x, args.grid_y, args.grid_size, args.use_sb_alg, 
+                                                        args.jobs, not args.no_cache, store, args.fast_scale)
+    
+    # reduce the views to a diverse subset
+    if args.max_views > 0:
+        subset = select_subset(objpoints, imgpoints, imgsize, args.grid_x, args.grid_y, args.max_views)
+        if args.compare_subset:
+            compare_subset(objpoints, subset, imgpoints, imgsize)
+        objpoints = subset
+    
     if args.display:
-        display_corners(args.image_dir, args.grid_x, args.grid_y, objpoints, imgpoints, imgsize)
+        display_corners(args.image_dir, args.grid_x, args.grid_y, objpoints, imgpoints, imgsize, store)
     
     # run the calibration
     calib_results = calibrate(objpoints, imgpoints, imgsize)
     if args.display:
-        display_undistorted(args.image_dir, imgsize, calib_results)
+        display_undistorted(args.image_dir, imgsize, calib_results, store)
     
     # save the results
-    save_results(args.image_dir, imgsize, calib_results)
+    save_results(output_dir, imgsize, calib_results)
     
     
 if __name__ == "__main__":
@@ -4,10 +4,32 @@ if platform.system() == "Darwin":
     import os
     os.environ['OPENCV_OPENCL_DEVICE'] = 'disabled'
 
-if platform.system() == "Linux":
-    from .display_fb import display, display_sbs
-else:
-    from .display import display, display_sbs
-
 from .camera import size_for_mode, mode_for_size, maxfps_for_mode
 
+
+# the display and model modules pull in opencv and numpy, so they're only imported when first used
+
+def _load_display():
+    # rebinds display and display_sbs to the real functions
+    global display, display_sbs
+    if platform.system() == "Linux":
+        from .display_fb import display, display_sbs
+    else:
+        from .display import display, display_sbs
+
+
+def display(label, img, seconds):
+    _load_display()
+    return display(label, img, seconds)
+
+
+def display_sbs(label, img1, img2, seconds):
+    _load_display()
+    return display_sbs(label, img1, img2, seconds)
+
+
+def __getattr__(name):
+    if name == "CameraModel":
+        from .model import CameraModel
+        return CameraModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,94 @@
+import time
+import threading
+
+import numpy as np
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from .frames import pull_samples, mapped_frames
+from .dewarp import TiledRemap
+from .model import find_model
+
+
+class DewarpBridge:
+    # pulls frames from the appsink, undistorts them with the remap tables on the cpu and pushes
+    #  the results into the appsrc with their original timestamps
+    def __init__(self, pipe, remap, channels=4):
+        self.appsink = pipe.get_by_name('bridge_in')
+        self.appsrc = pipe.get_by_name('bridge_out')
+        self.remap = remap
+        self.channels = channels
+
+        # the frame size is fixed by the caps on the bridge
+        st = self.appsink.get_property("caps").get_structure(0)
+        self.width, self.height = st.get_value("width"), st.get_value("height")
+
+        self.stop = threading.Event()
+        self.thread = None
+
+        self.frames = 0
+        self.busy = 0.0
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def close(self):
+        self.stop.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.remap.close()
+
+    def run(self):
+        out = np.empty((self.height, self.width, self.channels), np.uint8)
+        frames = mapped_frames(pull_samples(self.appsink, self.stop), self.width, self.height, self.channels)
+        try:
+            for idx, buffer, image in frames:
+                start = time.perf_counter()
+                if self.start_time is None:
+                    self.start_time = start
+
+                self.remap.apply(image, out)
+                outbuf = Gst.Buffer.new_wrapped(out.tobytes())
+                outbuf.pts = buffer.pts
+                outbuf.dts = buffer.dts
+                outbuf.duration = buffer.duration
+
+                self.end_time = time.perf_counter()
+                self.busy += self.end_time - start
+                self.frames += 1
+
+                if self.appsrc.emit("push-buffer", outbuf) != Gst.FlowReturn.OK:
+                    break
+        except RuntimeError as e:
+            # normally the upstream half of the pipeline has finished, anything else is a failure
+            if not self.appsink.is_eos():
+                print(f"dewarp failed: {e}", flush=True)
+        except Exception as e:
+            print(f"dewarp failed: {e}", flush=True)
+        finally:
+            # unmap the last frame now rather than when the generator is collected, and always end the
+            #  stream so the downstream half and the main loop don't wait forever
+            frames.close()
+            self.appsrc.emit("end-of-stream")
+
+    def report(self):
+        elapsed = self.end_time - self.start_time if self.frames > 1 else 0
+        fps = (self.frames - 1) / elapsed if elapsed > 0 else 0
+        ms = 1000 * self.busy / self.frames if self.frames else 0
+        return f"{self.frames} frames dewarped, {fps:0.1f} fps, {ms:0.1f} ms/frame"
+
+
+def make_dewarp_bridge(pipe, calfile, threads=4):
+    # the remap tables are built, or loaded, once for the size of the frames crossing the bridge. the
+    #  calibration is scaled to that size, or refused if the camera mode has a different aspect ratio
+    appsink = pipe.get_by_name('bridge_in')
+    st = appsink.get_property("caps").get_structure(0)
+    model = find_model(calfile, st.get_value("width"), st.get_value("height"))
+    map1, map2 = model.maps()
+
+    return DewarpBridge(pipe, TiledRemap(map1, map2, threads))
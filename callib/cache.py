@@ -0,0 +1,56 @@
+import os
+import hashlib
+import numpy as np
+
+
+def hash_file(fname):
+    h = hashlib.sha1()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(1024*1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(digest, grid_x, grid_y, use_sb_alg, scale=1):
+    alg = "sb" if use_sb_alg else "std"
+    if scale > 1:
+        alg = f"{alg}{scale}"
+    return f"{digest}-{grid_x}x{grid_y}-{alg}"
+
+
+def load_cache(cachefile):
+    # maps key -> (ret, corners, imgsize); failed detections are stored with no corners
+    cache = {}
+    if not os.path.exists(cachefile):
+        return cache
+
+    try:
+        with np.load(cachefile) as data:
+            for name in data.files:
+                key, field = name.rsplit(".", 1)
+                if field != "size":
+                    continue
+                corners = data[f"{key}.corners"]
+                imgsize = tuple(int(v) for v in data[name])
+                ret = len(corners) > 0
+                cache[key] = (ret, corners if ret else None, imgsize)
+    except (OSError, ValueError, KeyError):
+        print(f"ignoring unreadable cache {cachefile}")
+        return {}
+
+    return cache
+
+
+def save_cache(cachefile, cache):
+    arrays = {}
+    for key, (ret, corners, imgsize) in cache.items():
+        if not ret or corners is None:
+            corners = np.zeros((0, 1, 2), np.float32)
+        arrays[f"{key}.corners"] = corners
+        arrays[f"{key}.size"] = np.array(imgsize, np.int32)
+
+    # write to the side and rename so an interrupted run doesn't leave a broken cache
+    tmpfile = cachefile + ".tmp"
+    with open(tmpfile, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmpfile, cachefile)
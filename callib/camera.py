@@ -1,5 +1,3 @@
-
-
 def maxfps_for_mode(camera_mode):
     if camera_mode is None:
         camera_mode = 2
@@ -49,4 +47,3 @@ def mode_for_size(width, height):
     mode = min(mode_w, mode_h)
 
     return mode
-
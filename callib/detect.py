@@ -0,0 +1,30 @@
+import cv2
+
+
+def find_corners(gray, grid_x, grid_y, use_sb_alg):
+    if use_sb_alg:
+        ret, corners = cv2.findChessboardCornersSB(gray, (grid_x, grid_y))
+    else:
+        ret, corners = cv2.findChessboardCorners(gray, (grid_x, grid_y))
+        if ret:
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 300, 0.000001)
+            corners = cv2.cornerSubPix(gray,corners, (11,11), (-1,-1), criteria)
+
+    return ret, corners
+
+
+def search_coarse(small, grid_x, grid_y, use_sb_alg):
+    # reject frames without a board cheaply, then search on the small image
+    if use_sb_alg:
+        return cv2.findChessboardCornersSB(small, (grid_x, grid_y))
+
+    cb_flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+    return cv2.findChessboardCorners(small, (grid_x, grid_y), flags=cb_flags)
+
+
+def refine_coarse(gray, corners, scale):
+    # refine the scaled up corners on the full resolution image
+    corners = (corners + 0.5) * scale - 0.5
+    
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 300, 0.000001)
+    return cv2.cornerSubPix(gray, corners, (11,11), (-1,-1), criteria)
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+
+class TiledRemap:
+    # applies the remap tables to bands of rows on a pool of threads, each band of the output only
+    #  needs its own rows of the maps
+    def __init__(self, map1, map2, threads=4, tiles=None):
+        self.map1 = map1
+        self.map2 = map2
+
+        height = map1.shape[0]
+        bounds = np.linspace(0, height, (tiles or threads) + 1).astype(int)
+        self.bands = list(zip(bounds[:-1], bounds[1:]))
+        self.pool = ThreadPoolExecutor(threads) if threads > 1 else None
+
+    def _remap(self, img, out, y0, y1):
+        cv2.remap(img, self.map1[y0:y1], self.map2[y0:y1], cv2.INTER_LINEAR, dst=out[y0:y1])
+
+    def apply(self, img, out=None):
+        if out is None:
+            out = np.empty(self.map1.shape[:2] + img.shape[2:], img.dtype)
+
+        if self.pool is None:
+            cv2.remap(img, self.map1, self.map2, cv2.INTER_LINEAR, dst=out)
+        else:
+            # wait for every band, and raise anything that went wrong in one
+            for result in [self.pool.submit(self._remap, img, out, y0, y1) for y0, y1 in self.bands]:
+                result.result()
+
+        return out
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
@@ -0,0 +1,178 @@
+import os
+import re
+import mmap
+import fcntl
+import struct
+
+import numpy as np
+import cv2
+
+
+# ioctl for the variable screen info, which starts with the visible xres and yres
+FBIOGET_VSCREENINFO = 0x4600
+_VSCREENINFO_SIZE = 160
+
+
+def _visible_size(device):
+    try:
+        fd = os.open(device, os.O_RDONLY)
+        try:
+            info = fcntl.ioctl(fd, FBIOGET_VSCREENINFO, bytes(_VSCREENINFO_SIZE))
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    return struct.unpack_from("II", info)
+
+
+def read_geometry(device):
+    # the linux framebuffer publishes its geometry in sysfs, eg /sys/class/graphics/fb0
+    sysfs = os.path.join("/sys/class/graphics", os.path.basename(device))
+
+    def read(name):
+        with open(os.path.join(sysfs, name)) as f:
+            return f.read().strip()
+
+    # the virtual size can be taller than the screen when the framebuffer pans or is double
+    #  buffered, so the visible size comes from the device, or from the current mode, eg U:1920x1080p-60
+    virtual_width, virtual_height = (int(v) for v in read("virtual_size").split(","))
+    size = _visible_size(device)
+    if size is None and os.path.exists(os.path.join(sysfs, "mode")):
+        match = re.search(r"(\d+)x(\d+)", read("mode"))
+        size = (int(match.group(1)), int(match.group(2))) if match else None
+    width, height = size or (virtual_width, virtual_height)
+
+    bpp = int(read("bits_per_pixel"))
+    stride = int(read("stride")) if os.path.exists(os.path.join(sysfs, "stride")) else virtual_width * bpp // 8
+
+    return width, height, bpp, stride
+
+
+def letterbox(in_width, in_height, out_width, out_height):
+    # the largest size that fits with the aspect ratio kept, centred in the output
+    scale = min(out_width/in_width, out_height/in_height)
+    new_w, new_h = int(scale*in_width), int(scale*in_height)
+    left = (out_width - new_w) // 2
+    top = (out_height - new_h) // 2
+
+    return left, top, new_w, new_h
+
+
+def _overlaps(r1, r2):
+    x1, y1, w1, h1 = r1
+    x2, y2, w2, h2 = r2
+    return x1 < x2 + w2 and x2 < x1 + w1 and y1 < y2 + h2 and y2 < y1 + h1
+
+
+# conversions from the input channels to the framebuffer format, keyed by (channels, bpp)
+_CONVERSIONS = {
+    (1, 32): cv2.COLOR_GRAY2BGRA,
+    (3, 32): cv2.COLOR_BGR2BGRA,
+    (1, 16): cv2.COLOR_GRAY2BGR565,
+    (3, 16): cv2.COLOR_BGR2BGR565,
+    (4, 16): cv2.COLOR_BGRA2BGR565,
+}
+
+
+class Framebuffer:
+    def __init__(self, device="/dev/fb0", width=None, height=None, bpp=None, stride=None):
+        # the geometry comes from sysfs unless it's given, which allows a regular file to stand in
+        #  for the device
+        if width is None or height is None or bpp is None:
+            width, height, bpp, stride = read_geometry(device)
+        if bpp not in (16, 32):
+            raise ValueError(f"unsupported framebuffer depth: {bpp} bits per pixel")
+
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.pixel_bytes = bpp // 8
+        self.stride = stride or width * self.pixel_bytes
+
+        size = self.stride * height
+        self.fd = os.open(device, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < size and not device.startswith("/dev/"):
+            os.ftruncate(self.fd, size)
+        self.mm = mmap.mmap(self.fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+        # a view of the visible pixels, skipping any padding at the end of each row
+        rows = np.frombuffer(self.mm, np.uint8).reshape(height, self.stride)
+        self.pixels = rows[:, :width*self.pixel_bytes].reshape(height, width, self.pixel_bytes)
+
+        # layouts are worked out once for each input size and screen region, and the borders are only
+        #  cleared when the size drawn in a region changes
+        self.layouts = {}
+        self.drawn = {}
+
+    def close(self):
+        if self.mm is not None:
+            # the views onto the mapping have to go before it can be closed
+            self.pixels = None
+            self.layouts = {}
+            self.mm.close()
+            os.close(self.fd)
+            self.mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def clear(self):
+        self.pixels[:] = 0
+        self.drawn = {}
+
+    def layout(self, shape, region):
+        key = (shape, region)
+        entry = self.layouts.get(key)
+        if entry is None:
+            in_height, in_width = shape[:2]
+            channels = shape[2] if len(shape) == 3 else 1
+
+            rx, ry, rw, rh = region
+            left, top, new_w, new_h = letterbox(in_width, in_height, rw, rh)
+            target = self.pixels[ry+top:ry+top+new_h, rx+left:rx+left+new_w]
+
+            resize = (new_w, new_h) != (in_width, in_height)
+            convert = _CONVERSIONS.get((channels, self.bpp))
+            if convert is None and channels != self.pixel_bytes:
+                raise ValueError(f"can't display {channels} channel images on a {self.bpp} bit framebuffer")
+
+            # resizing and converting needs somewhere to put the resized image, it's allocated once
+            scratch = None
+            if resize and convert is not None:
+                scratch = np.empty((new_h, new_w, channels) if channels > 1 else (new_h, new_w), np.uint8)
+
+            entry = self.layouts[key] = (target, resize, convert, scratch)
+
+        return entry
+
+    def write(self, img, region=None):
+        # region is (x, y, width, height) on the screen, the whole screen by default
+        region = region or (0, 0, self.width, self.height)
+        target, resize, convert, scratch = self.layout(img.shape, region)
+
+        if self.drawn.get(region) != img.shape:
+            x, y, w, h = region
+            self.pixels[y:y+h, x:x+w] = 0
+            # anything drawn in an overlapping region has been cleared too
+            self.drawn = {r: s for r, s in self.drawn.items() if not _overlaps(r, region)}
+            self.drawn[region] = img.shape
+
+        # the results go straight into the mapped memory
+        if resize and convert is not None:
+            cv2.resize(img, (target.shape[1], target.shape[0]), dst=scratch)
+            cv2.cvtColor(scratch, convert, dst=target)
+        elif resize:
+            cv2.resize(img, (target.shape[1], target.shape[0]), dst=target)
+        elif convert is not None:
+            cv2.cvtColor(img, convert, dst=target)
+        else:
+            target[:] = img
+
+    def write_sbs(self, img1, img2):
+        # two images side by side, each letterboxed into half the screen
+        half = self.width // 2
+        self.write(img1, (0, 0, half, self.height))
+        self.write(img2, (half, 0, self.width - half, self.height))
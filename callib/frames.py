@@ -0,0 +1,46 @@
+from itertools import count
+
+import numpy as np
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+
+def pull_samples(appsink, stop=None, timeout=Gst.SECOND):
+    while True:
+        # wait with a timeout so the stop event is noticed
+        sample = None
+        while sample is None:
+            if stop is not None and stop.is_set():
+                return
+            sample = appsink.try_pull_sample(timeout)
+            if sample is None and appsink.is_eos():
+                raise RuntimeError("pipeline stopped")
+        yield sample
+
+
+def map_image(info, width, height, channels):
+    # a read-only numpy view of the mapped memory, skipping any row padding
+    data = np.frombuffer(info.data, np.uint8)
+    stride = len(data) // height
+    image = data[:height*stride].reshape(height, stride)[:, :width*channels].reshape(height, width, channels)
+    image.flags.writeable = False
+    return image
+
+
+def mapped_frames(samples, width, height, channels=4):
+    # yields each frame as a view onto the buffer's memory, valid only until the next frame is
+    #  requested - stages that need to keep the frame must copy it
+    for idx, sample in zip(count(), samples):
+        buffer = sample.get_buffer()
+        if buffer is None:
+            raise RuntimeError("sample has no buffer")
+
+        ok, info = buffer.map(Gst.MapFlags.READ)
+        if not ok:
+            raise RuntimeError("failed to map buffer")
+        try:
+            yield idx, buffer, map_image(info, width, height, channels)
+        finally:
+            buffer.unmap(info)
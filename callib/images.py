@@ -0,0 +1,125 @@
+import os, glob
+import cv2
+
+
+class ImageStore:
+    def __init__(self, image_dir, pattern="*.jpg", max_mbytes=512):
+        self.image_dir = image_dir
+        self.max_bytes = max_mbytes * 1024 * 1024
+
+        # the sorted manifest of images, built once
+        self.files = sorted(glob.glob(os.path.join(image_dir, pattern)))
+
+        # decoded images. the stages read the images in the same order, so the first ones that fit are
+        #  kept rather than evicting the oldest - with lru every image would be dropped just before it's
+        #  read again when the set is bigger than the budget
+        self._cache = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.files)
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def color(self, fname):
+        # the returned image is shared with the cache, copy it before drawing on it
+        img = self._cache.get(fname)
+        if img is not None:
+            self.hits += 1
+            return img
+
+        self.misses += 1
+        img = cv2.imread(fname)
+        if img is None:
+            raise RuntimeError(f"failed to read image {fname}")
+
+        # once the budget is used up the rest of the images are decoded each time they're read
+        if self.nbytes + img.nbytes <= self.max_bytes:
+            self._cache[fname] = img
+            self.nbytes += img.nbytes
+
+        return img
+
+    def gray(self, fname):
+        return cv2.cvtColor(self.color(fname), cv2.COLOR_BGR2GRAY)
+
+
+class VideoStore:
+    def __init__(self, source, frame_step=15, max_frames=0):
+        self.source = source
+        self.frame_step = max(frame_step, 1)
+        self.max_frames = max_frames
+
+        # names of the sampled frames, filled in as the video is read
+        self.files = []
+
+        # the capture used for random access by name, only ever moves forward
+        self._cap = None
+        self._pos = 0
+
+    def __len__(self):
+        return len(self.files)
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise RuntimeError(f"failed to open video {self.source}")
+        return cap
+
+    def _name(self, idx):
+        return f"{self.source}#{idx:06d}"
+
+    def frames(self):
+        # streams the sampled frames, skipped frames are grabbed but not decoded
+        cap = self._open()
+        self.files = []
+        try:
+            idx = 0
+            while self.max_frames <= 0 or len(self.files) < self.max_frames:
+                if idx % self.frame_step != 0:
+                    if not cap.grab():
+                        break
+                    idx += 1
+                    continue
+
+                ret, img = cap.read()
+                if not ret:
+                    break
+
+                name = self._name(idx)
+                self.files.append(name)
+                yield name, img
+                idx += 1
+        finally:
+            cap.release()
+
+    def color(self, name):
+        idx = int(name.rsplit("#", 1)[1])
+
+        # reading is sequential, so restart the video to go backwards
+        if self._cap is None or idx < self._pos:
+            if self._cap is not None:
+                self._cap.release()
+            self._cap = self._open()
+            self._pos = 0
+
+        while self._pos < idx:
+            if not self._cap.grab():
+                raise RuntimeError(f"failed to read frame {idx} of {self.source}")
+            self._pos += 1
+
+        ret, img = self._cap.read()
+        if not ret:
+            raise RuntimeError(f"failed to read frame {idx} of {self.source}")
+        self._pos += 1
+
+        return img
+
+    def gray(self, name):
+        return cv2.cvtColor(self.color(name), cv2.COLOR_BGR2GRAY)
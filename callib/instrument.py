@@ -0,0 +1,143 @@
+import time
+import json
+import bisect
+
+
+# histogram bucket upper bounds in milliseconds, the last bucket takes everything above
+BUCKETS_MS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 15, 20, 30, 40, 50, 75, 100, 200, 500, 1000]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, pct):
+        # the upper bound of the bucket the percentile falls in
+        target = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS + [self.max], self.counts):
+            seen += count
+            if seen >= target and count > 0:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count if self.count else 0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'max_ms': self.max,
+            'buckets_ms': BUCKETS_MS,
+            'counts': self.counts,
+        }
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.time = Histogram()
+
+    def to_dict(self):
+        return {'frames': self.frames, 'time': self.time.to_dict()}
+
+
+class Instrument:
+    # wraps each stage of a generator pipeline and records the time spent in it per frame. a wrapper sees
+    #  the time to get an item from its stage, which includes the upstream stages, so the time spent in
+    #  the upstream wrappers during the call is taken off to leave the stage's own time
+    def __init__(self, name="", fps=0, report_every=10):
+        self.name = name
+        self.fps = fps
+        self.report_every = report_every
+        self.stages = []
+        self.upstream = 0.0
+
+        # frame timing from the buffer timestamps
+        self.intervals = Histogram()
+        self.last_pts = None
+        self.dropped = 0
+
+        self.start = None
+        self.next_report = None
+
+    def wrap(self, pipe, name):
+        stage = Stage(name)
+        self.stages.append(stage)
+        return self._run(pipe, stage)
+
+    def _run(self, pipe, stage):
+        pipe = iter(pipe)
+        while True:
+            start = time.perf_counter()
+            outer, self.upstream = self.upstream, 0.0
+            try:
+                item = next(pipe)
+            except StopIteration:
+                self.upstream = outer
+                return
+            now = time.perf_counter()
+            elapsed = now - start
+
+            stage.frames += 1
+            stage.time.add(1000 * (elapsed - self.upstream))
+            self.upstream = outer + elapsed
+
+            # the first stage sees every frame from the camera
+            if stage is self.stages[0]:
+                self.frame(item.get('pts'))
+
+            if self.next_report is None:
+                self.start = now
+                self.next_report = now + self.report_every
+            elif self.report_every > 0 and now >= self.next_report:
+                self.next_report = now + self.report_every
+                print(self.summary(), flush=True)
+
+            yield item
+
+    def frame(self, pts):
+        # gaps in the timestamps longer than a frame period are frames the pipeline dropped
+        if pts is None:
+            return
+        if self.last_pts is not None:
+            interval = (pts - self.last_pts) / 1e6
+            self.intervals.add(interval)
+            if self.fps > 0:
+                period = 1000 / self.fps
+                self.dropped += max(0, round(interval / period) - 1)
+        self.last_pts = pts
+
+    def summary(self):
+        prefix = f"{self.name}: " if self.name else ""
+        elapsed = time.perf_counter() - self.start if self.start else 0
+        frames = self.stages[0].frames if self.stages else 0
+        fps = frames / elapsed if elapsed > 0 else 0
+
+        stages = ", ".join(f"{s.name} {s.time.to_dict()['mean_ms']:0.2f}/{s.time.percentile(95):0.1f} ms" for s in self.stages)
+        return f"{prefix}{frames} frames, {fps:0.1f} fps, {self.dropped} dropped | mean/p95 {stages}"
+
+    def to_dict(self):
+        elapsed = time.perf_counter() - self.start if self.start else 0
+        return {
+            'fps_expected': self.fps,
+            'elapsed_s': elapsed,
+            'dropped': self.dropped,
+            'intervals': self.intervals.to_dict(),
+            'stages': {stage.name: stage.to_dict() for stage in self.stages},
+        }
+
+
+def save_report(path, instruments):
+    with open(path, "w") as f:
+        json.dump({inst.name or "sensor": inst.to_dict() for inst in instruments}, f, indent=2)
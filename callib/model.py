@@ -0,0 +1,185 @@
+import os
+import struct
+import zipfile
+import configparser
+
+import numpy as np
+import cv2
+
+from .camera import size_for_mode
+from .undistort import load_calibration, build_maps, undistort
+
+
+def _mmap_member(path, name):
+    # members of an uncompressed npz are plain .npy files inside the zip, so can be mapped in place
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    with open(path, "rb") as f:
+        # skip the zip local file header to get to the .npy data
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran_order else "C")
+
+
+def _read_size(calfile):
+    # the image size and camera mode aren't in cal-raw.xml, look for them in the files alongside
+    cal_dir = os.path.dirname(calfile)
+
+    confile = os.path.join(cal_dir, "cal-config.txt")
+    if os.path.exists(confile):
+        config = configparser.ConfigParser()
+        config.read(confile)
+        prop = config['property']
+        return int(prop['output-width']), int(prop['output-height']), prop.get('camera-mode', None)
+
+    capfile = os.path.join(cal_dir, "capture.txt")
+    if os.path.exists(capfile):
+        config = configparser.ConfigParser()
+        config.read(capfile)
+        camera = config['camera']
+        return int(camera['camera-width']), int(camera['camera-height']), camera.get('camera-mode', None)
+
+    return None, None, None
+
+
+def is_calibration(calfile):
+    # the calibration itself, rather than the dewarper config made from it
+    return calfile.endswith((".xml", ".npz"))
+
+
+def read_calconfig(calfile):
+    # the dewarper config's properties, for the calibration itself the config saved alongside it is read
+    if is_calibration(calfile):
+        calfile = os.path.join(os.path.dirname(calfile), "cal-config.txt")
+        if not os.path.exists(calfile):
+            return None
+
+    config = configparser.ConfigParser()
+    config.read(calfile)
+    return config['property']
+
+
+class CameraModel:
+    def __init__(self, camera_mtx, distortion_coeffs, width, height, camera_mode=None, optimal_camera_mtx=None, map1=None, map2=None):
+        self.camera_mtx = camera_mtx
+        self.distortion_coeffs = distortion_coeffs
+        self.width = width
+        self.height = height
+        self.camera_mode = camera_mode
+
+        if optimal_camera_mtx is None:
+            optimal_camera_mtx, roi = cv2.getOptimalNewCameraMatrix(camera_mtx, distortion_coeffs, (width, height), 0, (width, height))
+        self.optimal_camera_mtx = optimal_camera_mtx
+
+        self.map1 = map1
+        self.map2 = map2
+
+    @classmethod
+    def from_xml(cls, calfile, width=None, height=None, camera_mode=None):
+        # the model is made at the size the calibration was done at, then scaled to the size asked for
+        camera_mtx, distortion_coeffs = load_calibration(calfile)
+
+        cal_width, cal_height, mode = _read_size(calfile)
+        if camera_mode is None:
+            camera_mode = mode
+        if cal_width is None or cal_height is None:
+            if width is not None and height is not None:
+                print(f"the calibrated size isn't known, assuming {calfile} is for {width}x{height}")
+                cal_width, cal_height = width, height
+            else:
+                camera_mode, cal_width, cal_height = size_for_mode(camera_mode)
+
+        camera_mode = None if camera_mode is None else int(camera_mode)
+        model = cls(camera_mtx, distortion_coeffs, int(cal_width), int(cal_height), camera_mode)
+        if width is None or height is None:
+            return model
+        return model.scaled(int(width), int(height))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with np.load(path) as data:
+            width, height = (int(v) for v in data['size'])
+            camera_mode = int(data['camera_mode'])
+            model = cls(data['camera_mtx'], data['distortion_coeffs'], width, height,
+                            None if camera_mode < 0 else camera_mode, data['optimal_camera_mtx'])
+            has_maps = 'map1' in data.files
+
+        # the maps are mapped read-only so processes loading the same file share the pages
+        if has_maps:
+            if mmap:
+                model.map1, model.map2 = _mmap_member(path, 'map1'), _mmap_member(path, 'map2')
+            if model.map1 is None or model.map2 is None:
+                with np.load(path) as data:
+                    model.map1, model.map2 = data['map1'], data['map2']
+
+        return model
+
+    def save(self, path, with_maps=True):
+        arrays = {
+            'camera_mtx': np.asarray(self.camera_mtx, np.float64),
+            'distortion_coeffs': np.asarray(self.distortion_coeffs, np.float64),
+            'optimal_camera_mtx': np.asarray(self.optimal_camera_mtx, np.float64),
+            'size': np.array([self.width, self.height], np.int32),
+            'camera_mode': np.array(-1 if self.camera_mode is None else self.camera_mode, np.int32),
+        }
+        if with_maps:
+            map1, map2 = self.maps()
+            arrays['map1'] = map1
+            arrays['map2'] = map2
+
+        # stored uncompressed so the maps can be memory mapped
+        tmpfile = path + ".tmp"
+        with open(tmpfile, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmpfile, path)
+
+    def scaled(self, width, height):
+        # the same calibration for another camera mode, which only works if the mode is the full sensor
+        #  binned or scaled, not a crop of it
+        if (width, height) == (self.width, self.height):
+            return self
+        if abs(width / height - self.width / self.height) > 0.01 * self.width / self.height:
+            raise ValueError(f"can't scale a {self.width}x{self.height} calibration to {width}x{height}, the aspect ratio is different")
+
+        sx, sy = width / self.width, height / self.height
+        camera_mtx = np.array(self.camera_mtx, np.float64)
+        camera_mtx[0] *= sx
+        camera_mtx[1] *= sy
+        return CameraModel(camera_mtx, self.distortion_coeffs, width, height)
+
+    def maps(self):
+        if self.map1 is None or self.map2 is None:
+            self.map1, self.map2 = build_maps(self.camera_mtx, self.distortion_coeffs, self.optimal_camera_mtx, (self.height, self.width))
+        return self.map1, self.map2
+
+    def undistort(self, img):
+        map1, map2 = self.maps()
+        return undistort(img, map1, map2)
+
+
+def find_model(calfile, width, height):
+    # the calibration tool saves the model, the raw calibration and the dewarper config side by side,
+    #  so any of them can be given. the saved model is used if there is one
+    cal_dir = os.path.dirname(calfile)
+    modelfile = calfile if calfile.endswith(".npz") else os.path.join(cal_dir, "cal-model.npz")
+    rawfile = calfile if calfile.endswith(".xml") else os.path.join(cal_dir, "cal-raw.xml")
+
+    if os.path.exists(modelfile):
+        return CameraModel.load(modelfile).scaled(width, height)
+
+    if not os.path.exists(rawfile):
+        raise FileNotFoundError(f"no cal-model.npz or cal-raw.xml in {cal_dir or '.'}")
+    return CameraModel.from_xml(rawfile, width, height)
@@ -0,0 +1,74 @@
+import threading
+from collections import deque
+
+
+class FrameRing:
+    # keeps the most recent frames, up to a number of seconds and a hard cap on their total size. the
+    #  items are kept by reference, so encoded buffers are held without being copied
+    def __init__(self, max_bytes, seconds=None):
+        self.max_bytes = max_bytes
+        self.seconds = seconds
+        self.frames = deque()
+        self.lock = threading.Lock()
+
+        # statistics
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.added = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    def _evict(self, newest):
+        # oldest first, until both the size and the age are within the limits
+        while self.frames:
+            ts, size, item = self.frames[0]
+            too_old = self.seconds is not None and newest - ts > self.seconds
+            if self.bytes <= self.max_bytes and not too_old:
+                break
+            self.frames.popleft()
+            self.bytes -= size
+            self.evicted += 1
+
+    def add(self, ts, size, item):
+        # ts is in seconds, and frames are added in order
+        with self.lock:
+            if size > self.max_bytes:
+                self.rejected += 1
+                return False
+
+            self.frames.append((ts, size, item))
+            self.bytes += size
+            self.added += 1
+            self._evict(ts)
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+        return True
+
+    def take(self):
+        # empties the ring and returns what it held, oldest first
+        with self.lock:
+            frames = list(self.frames)
+            self.frames.clear()
+            self.bytes = 0
+        return frames
+
+    def span(self):
+        with self.lock:
+            return self.frames[-1][0] - self.frames[0][0] if len(self.frames) > 1 else 0
+
+    def report(self):
+        mb = 1024 * 1024
+        return (f"{len(self.frames)} frames over {self.span():0.1f} s, {self.bytes / mb:0.1f} MB "
+                f"of {self.max_bytes / mb:0.0f} MB, peak {self.peak_bytes / mb:0.1f} MB, "
+                f"{self.evicted} evicted, {self.rejected} too large")
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'frames': len(self.frames),
+                'bytes': self.bytes,
+                'peak_bytes': self.peak_bytes,
+                'max_bytes': self.max_bytes,
+                'added': self.added,
+                'evicted': self.evicted,
+                'rejected': self.rejected,
+            }
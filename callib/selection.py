@@ -0,0 +1,97 @@
+import numpy as np
+import cv2
+
+
+def view_features(corners, grid_x, grid_y, imgsize):
+    h, w = imgsize
+    points = corners.reshape(grid_y, grid_x, 2)
+
+    # position and size of the board in the image
+    cx, cy = points[..., 0].mean() / w, points[..., 1].mean() / h
+    hull = cv2.convexHull(corners.reshape(-1, 1, 2).astype(np.float32))
+    scale = np.sqrt(cv2.contourArea(hull) / (w * h))
+
+    # the board tilt shows up as the difference in length of opposite edges
+    top = np.linalg.norm(points[0, -1] - points[0, 0])
+    bottom = np.linalg.norm(points[-1, -1] - points[-1, 0])
+    left = np.linalg.norm(points[-1, 0] - points[0, 0])
+    right = np.linalg.norm(points[-1, -1] - points[0, -1])
+    tilt_x = np.log(top / bottom)
+    tilt_y = np.log(left / right)
+
+    # in-plane rotation, doubled so a board detected upside down looks the same
+    dx, dy = points[0, -1] - points[0, 0]
+    angle = 2 * np.arctan2(dy, dx)
+
+    return np.array([cx, cy, scale, tilt_x, tilt_y, 0.25 * np.cos(angle), 0.25 * np.sin(angle)])
+
+
+def view_cells(corners, imgsize, cells_x=8, cells_y=6):
+    h, w = imgsize
+    points = corners.reshape(-1, 2)
+
+    col = np.clip((points[:, 0] * cells_x / w).astype(int), 0, cells_x - 1)
+    row = np.clip((points[:, 1] * cells_y / h).astype(int), 0, cells_y - 1)
+
+    return set((row * cells_x + col).tolist())
+
+
+def select_views(imgpoints, grid_x, grid_y, imgsize, max_views, cells_x=8, cells_y=6):
+    # greedily picks views that add image coverage and differ most in pose from those already picked;
+    #  returns the indices of the selected views in their original order
+    if len(imgpoints) <= max_views:
+        return list(range(len(imgpoints)))
+
+    features = np.array([view_features(corners, grid_x, grid_y, imgsize) for corners in imgpoints])
+    cells = [view_cells(corners, imgsize, cells_x, cells_y) for corners in imgpoints]
+    ncells = cells_x * cells_y
+
+    # start with the view covering the most of the image
+    selected = [max(range(len(cells)), key=lambda idx: len(cells[idx]))]
+    covered = set(cells[selected[0]])
+    distance = np.linalg.norm(features - features[selected[0]], axis=1)
+
+    while len(selected) < max_views:
+        gain = np.array([len(view - covered) for view in cells]) / ncells
+        score = gain + distance
+        score[selected] = -1
+
+        idx = int(np.argmax(score))
+        selected.append(idx)
+        covered |= cells[idx]
+        distance = np.minimum(distance, np.linalg.norm(features - features[idx], axis=1))
+
+    return sorted(selected)
+
+
+class CoverageTracker:
+    # keeps the views accepted so far, to decide during capture if a new view adds anything
+    def __init__(self, grid_x, grid_y, imgsize, cells_x=8, cells_y=6, min_gain=2, min_distance=0.15):
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.imgsize = imgsize
+        self.cells_x = cells_x
+        self.cells_y = cells_y
+        self.min_gain = min_gain
+        self.min_distance = min_distance
+
+        self.covered = set()
+        self.features = []
+
+    def coverage(self):
+        return len(self.covered) / (self.cells_x * self.cells_y)
+
+    def accept(self, corners):
+        # a view is new if it covers enough cells that aren't covered yet, or its pose is far enough
+        #  from every view accepted so far
+        cells = view_cells(corners, self.imgsize, self.cells_x, self.cells_y)
+        feature = view_features(corners, self.grid_x, self.grid_y, self.imgsize)
+
+        gain = len(cells - self.covered)
+        distance = min(np.linalg.norm(f - feature) for f in self.features) if self.features else np.inf
+        if gain < self.min_gain and distance < self.min_distance:
+            return False
+
+        self.covered |= cells
+        self.features.append(feature)
+        return True
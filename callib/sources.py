@@ -0,0 +1,118 @@
+import os
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from .camera import size_for_mode, maxfps_for_mode
+
+
+# argus is the camera on the jetson, the others stand in for it so the pipelines can run anywhere:
+#  test  - a test pattern
+#  dir   - a directory of images, looped
+#  file  - a video file
+BACKENDS = ['argus', 'test', 'dir', 'file']
+
+
+def is_device(backend):
+    # argus frames are in NVMM device memory, everything else is in system memory
+    return backend == 'argus'
+
+
+def memory_caps(backend):
+    return "video/x-raw(memory:NVMM)" if is_device(backend) else "video/x-raw"
+
+
+def flip_method(hflip, vflip):
+    # the method names are the same for nvvideoconvert and videoflip
+    if hflip and vflip:
+        return "rotate-180"
+    if hflip:
+        return "horizontal-flip"
+    if vflip:
+        return "vertical-flip"
+    return None
+
+
+def _image_pattern(location):
+    # a directory is read with the capture tool's naming, otherwise location is a printf style pattern
+    if os.path.isdir(location):
+        location = os.path.join(location, "image_%02d.jpg")
+    kind = "png" if location.lower().endswith(".png") else "jpeg"
+    return location, kind
+
+
+def source_description(backend, cam_mode, sensor_id=0, location=None, fps=None):
+    cam_mode, width, height = size_for_mode(cam_mode)
+    fps = fps or maxfps_for_mode(cam_mode)
+    size = f"width=(int){width}, height=(int){height}"
+
+    # every source delivers frames at the size and rate of the camera mode
+    if backend == 'argus':
+        return (f"nvarguscamerasrc sensor-id={sensor_id} bufapi-version=true sensor-mode={cam_mode} "
+                f"! video/x-raw(memory:NVMM), {size}, format=(string)NV12, framerate=(fraction){fps}/1")
+
+    if backend == 'test':
+        return (f"videotestsrc is-live=true pattern={sensor_id} "
+                f"! video/x-raw, {size}, framerate=(fraction){fps}/1")
+
+    if location is None:
+        raise ValueError(f"the {backend} source needs a location")
+
+    if backend == 'dir':
+        pattern, kind = _image_pattern(location)
+        decoder = "pngdec" if kind == "png" else "jpegdec"
+        return (f"multifilesrc location=\"{pattern}\" index=0 loop=true caps=\"image/{kind}, framerate=(fraction){fps}/1\" "
+                f"! {decoder} ! videoscale ! videoconvert ! video/x-raw, {size}")
+
+    if backend == 'file':
+        return (f"filesrc location=\"{location}\" ! decodebin ! videoconvert ! videoscale ! videorate "
+                f"! video/x-raw, {size}, framerate=(fraction){fps}/1")
+
+    raise ValueError(f"unknown source backend: {backend}")
+
+
+def make_source(backend, cam_mode, sensor_id=0, location=None, fps=None):
+    # the source is a bin so the tools can treat every backend as one element
+    desc = source_description(backend, cam_mode, sensor_id, location, fps)
+    node = Gst.parse_bin_from_description(desc, True)
+    node.set_name(f"source{sensor_id}")
+    return node
+
+
+def make_convert(backend, flip=None):
+    # converts and scales to whatever the caps after it ask for, in device memory for argus
+    if is_device(backend):
+        node = Gst.ElementFactory.make('nvvideoconvert')
+        if flip is not None:
+            Gst.util_set_object_arg(node, "flip-method", flip)
+        return node
+
+    desc = "videoscale ! videoconvert"
+    if flip is not None:
+        desc = f"videoflip method={flip} ! {desc}"
+    return Gst.parse_bin_from_description(desc, True)
+
+
+def make_bridge_ends(width, height, fps, fmt="BGRx"):
+    # the pipeline is split in two around the cpu stage: frames leave through the appsink and the
+    #  processed frames come back in through the appsrc
+    caps = f"video/x-raw, width=(int){width}, height=(int){height}, format=(string){fmt}, framerate=(fraction){fps}/1"
+
+    appsink = Gst.ElementFactory.make('appsink', 'bridge_in')
+    Gst.util_set_object_arg(appsink, "caps", caps)
+    Gst.util_set_object_arg(appsink, "max-buffers", "2")
+    Gst.util_set_object_arg(appsink, "sync", "false")
+
+    appsrc = Gst.ElementFactory.make('appsrc', 'bridge_out')
+    Gst.util_set_object_arg(appsrc, "caps", caps)
+    Gst.util_set_object_arg(appsrc, "format", "time")
+    Gst.util_set_object_arg(appsrc, "is-live", "true")
+    Gst.util_set_object_arg(appsrc, "max-bytes", f"{2 * width * height * 4}")
+    Gst.util_set_object_arg(appsrc, "block", "true")
+
+    return appsink, appsrc
+
+
+def has_bridge(pipe):
+    return pipe.get_by_name('bridge_in') is not None
@@ -0,0 +1,23 @@
+import cv2
+
+
+def load_calibration(calfile):
+    fs = cv2.FileStorage(calfile, cv2.FileStorage_READ)
+    if not fs.isOpened():
+        raise RuntimeError(f"failed to open calibration file {calfile}")
+    camera_mtx = fs.getNode("cameraMatrix").mat()
+    distortion_coeffs = fs.getNode("distCoeffs").mat()
+    fs.release()
+
+    return camera_mtx, distortion_coeffs
+
+
+def build_maps(camera_mtx, distortion_coeffs, optimal_camera_mtx, imgsize):
+    # fixed point maps: 16 bit integer coordinates plus an interpolation table index
+    h, w = imgsize
+    map1, map2 = cv2.initUndistortRectifyMap(camera_mtx, distortion_coeffs, None, optimal_camera_mtx, (w, h), cv2.CV_16SC2)
+    return map1, map2
+
+
+def undistort(img, map1, map2):
+    return cv2.remap(img, map1, map2, cv2.INTER_LINEAR)
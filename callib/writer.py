@@ -0,0 +1,172 @@
+import os
+import time
+import queue
+import threading
+
+from .instrument import Histogram
+
+
+# when written files are flushed to the storage:
+#  none  - left to the os
+#  batch - once per batch of writes, so a slow sync is shared by several files
+#  each  - after every file
+FSYNC_POLICIES = ['none', 'batch', 'each']
+
+
+def fsync_file(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(path):
+    # makes new directory entries durable, not just the file contents
+    fsync_file(os.path.dirname(os.path.abspath(path)))
+
+
+class BackgroundWriter:
+    def __init__(self, write, threads=1, max_queue=4, block=True, batch=1, fsync='none'):
+        # write(path, data) is called on the worker threads and returns True on success
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy: {fsync}")
+
+        self.write = write
+        self.block = block
+        self.batch = max(batch, 1)
+        self.fsync = fsync
+        self.queue = queue.Queue(max_queue)
+        self.closed = False
+        # held from the closed check until the item is queued, so nothing lands behind the stop markers
+        self.submit_lock = threading.Lock()
+
+        # statistics
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.write_time = Histogram()
+        self.latency = Histogram()
+
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def submit(self, path, data):
+        # the data must not change after it's submitted, copy frames that are views onto buffers
+        with self.submit_lock:
+            if self.closed:
+                with self.lock:
+                    self.dropped += 1
+                return False
+
+            item = (path, data, time.perf_counter())
+            if self.block:
+                # back-pressure: the caller waits until there's room in the queue
+                self.queue.put(item)
+            else:
+                try:
+                    self.queue.put_nowait(item)
+                except queue.Full:
+                    with self.lock:
+                        self.dropped += 1
+                    return False
+
+        with self.lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def _next_batch(self):
+        # waits for one item then takes whatever else is already queued, up to the batch size
+        items = [self.queue.get()]
+        while len(items) < self.batch and items[-1] is not None:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, path, data):
+        start = time.perf_counter()
+        try:
+            ok = self.write(path, data)
+            if ok and self.fsync == 'each':
+                fsync_file(path)
+        except Exception as e:
+            print(f"failed to write {path}: {e}", flush=True)
+            ok = False
+        return ok, time.perf_counter() - start
+
+    def _run(self):
+        running = True
+        while running:
+            items = self._next_batch()
+            if items[-1] is None:
+                running = False
+
+            done = []
+            for item in items:
+                if item is None:
+                    continue
+                path, data, submitted = item
+                ok, duration = self._write(path, data)
+                done.append((path, ok, duration, submitted))
+
+            # one sync for the batch, the files and then their directory
+            written = [path for path, ok, duration, submitted in done if ok]
+            if self.fsync == 'batch' and written:
+                try:
+                    for path in written:
+                        fsync_file(path)
+                    fsync_dir(written[0])
+                except OSError as e:
+                    print(f"failed to sync: {e}", flush=True)
+
+            now = time.perf_counter()
+            with self.lock:
+                for path, ok, duration, submitted in done:
+                    self.write_time.add(1000 * duration)
+                    self.latency.add(1000 * (now - submitted))
+                    if ok:
+                        self.written += 1
+                    else:
+                        self.failed += 1
+
+            for _ in items:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        # everything queued is written before the threads stop, anything submitted after is refused
+        with self.submit_lock:
+            self.closed = True
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def report(self):
+        with self.lock:
+            return (f"{self.written} written, {self.failed} failed, {self.dropped} dropped, "
+                    f"max queue depth {self.max_depth}, write {self.write_time.to_dict()['mean_ms']:0.1f} ms mean "
+                    f"{self.write_time.percentile(95):0.0f} ms p95, submit to done {self.latency.percentile(95):0.0f} ms p95")
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'written': self.written,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'max_queue_depth': self.max_depth,
+                'write': self.write_time.to_dict(),
+                'latency': self.latency.to_dict(),
+            }
@@ -1,125 +1,203 @@
 #!/usr/bin/env python3
 import argparse
-import sys, os, io
+import sys, os
 import time
+import threading
 from datetime import datetime
-from itertools import count, islice
+from itertools import count
 
 import gi
 gi.require_version('Gst', '1.0')
 gi.require_version('GstApp', '1.0')
 from gi.repository import GLib, Gst, GstApp
 
-import numpy as np
 import cv2
 
 import callib
+from callib import sources
+from callib.frames import pull_samples, mapped_frames
+from callib.framebuffer import Framebuffer, letterbox
+from callib.writer import BackgroundWriter
+from callib.selection import CoverageTracker
+from callib.instrument import Instrument, save_report
+from callib.detect import search_coarse
 
 
-def build_gst_pipeline(cam_mode, hflip, vflip):
-    # initialise the system
-    Gst.init(sys.argv)
-    
-    # hard coded for now
-    cam_mode, cam_width, cam_height = callib.size_for_mode(cam_mode)
-    fps = callib.maxfps_for_mode(cam_mode)
-    
-    # build the pipeline
-    nodes = []
-    
-    node = Gst.ElementFactory.make('nvarguscamerasrc')
-    nodes.append(node)
-    Gst.util_set_object_arg(node, "sensor-id", "0")
-    Gst.util_set_object_arg(node, "bufapi-version", "true")
-    Gst.util_set_object_arg(node, "sensor-mode", f"{cam_mode}")
-    
-    node = Gst.ElementFactory.make('capsfilter')
+def make_node(nodes, factory, **props):
+    node = Gst.ElementFactory.make(factory)
+    if node is None:
+        raise RuntimeError(f"failed to create {factory}")
     nodes.append(node)
-    Gst.util_set_object_arg(node, "caps", f"video/x-raw(memory:NVMM), framerate=(fraction){fps}/1")
+    for name, value in props.items():
+        Gst.util_set_object_arg(node, name.replace('_', '-'), f"{value}")
+    return node
 
-    node = Gst.ElementFactory.make('nvvideoconvert')
-    nodes.append(node)
-    
-    if hflip and vflip:
-        Gst.util_set_object_arg(node, "flip-method", "2")
-    elif hflip:
-        Gst.util_set_object_arg(node, "flip-method", "4")
-    elif vflip:
-        Gst.util_set_object_arg(node, "flip-method", "6")
-        
-    node = Gst.ElementFactory.make('capsfilter')
-    nodes.append(node)
-    Gst.util_set_object_arg(node, "caps", f"video/x-raw, width=(int){cam_width}, height=(int){cam_height}, format=(string)BGRx")
-    
-    appsink = node = Gst.ElementFactory.make('appsink')
-    nodes.append(node)
-    Gst.util_set_object_arg(node, "max-buffers", "5")
-    Gst.util_set_object_arg(node, "drop", "true")
 
-    pipe = Gst.Pipeline.new('pipe')
+def link_nodes(pipe, nodes):
+    print("Linking nodes:")
     for node in nodes:
         pipe.add(node)
-    
-    print("Linking nodes:")
     for n0, n1 in zip(nodes, nodes[1:]):
         print(f"  -> {n0.name}: {len(n0.sinkpads)} {len(n0.srcpads)}")
         r = n0.link(n1)
         if r == False:
             print(f"failed to link nodes {n0.name} and {n1.name}")
-            return None, None
+            return False
 
     print(f"  -> {n1.name}: {len(n1.sinkpads)} {len(n1.srcpads)}")
+    return True
+
+
+def build_preview_branch(pipe, tee, preview_size, preview_fps, backend):
+    # a scaled copy of the stream for the display, so the full resolution frames are only used for capture.
+    #  the leaky queue and the rate limit mean the preview can never hold up the capture branch
+    preview_width, preview_height = preview_size
+    
+    nodes = [tee]
+    try:
+        make_node(nodes, 'queue', leaky="downstream", max_size_buffers=1)
+        make_node(nodes, 'videorate', drop_only="true", max_rate=preview_fps)
+        nodes.append(sources.make_convert(backend))
+        make_node(nodes, 'capsfilter', caps=f"video/x-raw, width=(int){preview_width}, height=(int){preview_height}, format=(string)BGRx")
+        appsink = make_node(nodes, 'appsink', max_buffers=1, drop="true", sync="false")
+    except (RuntimeError, GLib.Error) as e:
+        print(f"no preview branch: {e}")
+        return None
     
-    return pipe, appsink
+    for node in nodes[1:]:
+        pipe.add(node)
+    for n0, n1 in zip(nodes, nodes[1:]):
+        if n0.link(n1) == False:
+            print(f"no preview branch: failed to link nodes {n0.name} and {n1.name}")
+            for node in nodes[1:]:
+                pipe.remove(node)
+            return None
+    
+    return appsink
 
 
-def camera(appsink, cam_mode):
+def build_gst_pipeline(cam_mode, hflip, vflip, sensor_id=0, backend='argus', location=None, preview_size=None, preview_fps=15):
+    # initialise the system
+    Gst.init(sys.argv)
+    
+    # hard coded for now
     cam_mode, cam_width, cam_height = callib.size_for_mode(cam_mode)
     
-    for idx in count():
-        sample = appsink.pull_sample()
-        if sample is None:
-            raise RuntimeError("pipeline stopped")
+    # build the pipeline, the source is the camera or one of the stand-ins for it
+    nodes = [sources.make_source(backend, cam_mode, sensor_id, location)]
+    flip = sources.flip_method(hflip, vflip)
+    
+    tee = None
+    if preview_size is not None:
+        # flip before splitting the stream, the camera branch then converts the full resolution frames
+        if flip is not None:
+            nodes.append(sources.make_convert(backend, flip))
+            make_node(nodes, 'capsfilter', caps=sources.memory_caps(backend))
+            flip = None
+        tee = make_node(nodes, 'tee')
+        make_node(nodes, 'queue')
+    
+    nodes.append(sources.make_convert(backend, flip))
+    make_node(nodes, 'capsfilter', caps=f"video/x-raw, width=(int){cam_width}, height=(int){cam_height}, format=(string)BGRx")
+    appsink = make_node(nodes, 'appsink', max_buffers=5, drop="true")
+
+    pipe = Gst.Pipeline.new(f'pipe{sensor_id}')
+    if not link_nodes(pipe, nodes):
+        return None, None, None
+    
+    preview_sink = None
+    if tee is not None:
+        preview_sink = build_preview_branch(pipe, tee, preview_size, preview_fps, backend)
+    
+    return pipe, appsink, preview_sink
 
-        buffer = sample.get_buffer()
-        if buffer is None:
-            raise RuntimeError("sample has no buffer")
 
-        data = buffer.extract_dup(0, buffer.get_size())
+def camera(appsink, cam_mode, stop, stats=None):
+    cam_mode, cam_width, cam_height = callib.size_for_mode(cam_mode)
+    
+    # the image is a read-only view of the mapped buffer, only valid until the next item
+    samples = pull_samples(appsink, stop)
+    for idx, buffer, image in mapped_frames(samples, cam_width, cam_height):
+        if stats is not None:
+            stats.setdefault('start', time.perf_counter())
+            stats['frames'] = idx + 1
+            stats['end'] = time.perf_counter()
         
         item = {
             'idx': idx,
             'mode': cam_mode,
             'width': cam_width,
             'height': cam_height,
-            'data': data,
+            'image': image,
+            'pts': buffer.pts,
         }
         yield item
 
 
-def preview(pipe):
-    with open("/dev/fb0", "wb") as fb:
-        for item in pipe:
-            image_data = item['data']
-            image_width, image_height = item['width'], item['height']
-
-            if image_width != 1920 or image_height != 1080:
-                scale = min(1920/image_width, 1080/image_height)
-                new_w, new_h = int(scale*image_width), int(scale*image_height)
-                left = int((1920 - new_w)/2)
-                right = 1920 - new_w -left
-                top = int((1080 - new_h)/2)
-                bottom = 1080 - new_h - top
-                
-                image_array = np.ndarray((image_height, image_width, 4), np.uint8, image_data)
-                image_array = cv2.resize(image_array, (new_w, new_h))
-                image_array = cv2.copyMakeBorder(image_array, top, bottom, left, right, cv2.BORDER_CONSTANT, (0, 0, 0))
-
-                image_data = image_array.tobytes()
-            
-            fb.seek(0, io.SEEK_SET)
-            fb.write(image_data)
-            yield item
+class Preview:
+    # shows frames on the framebuffer from its own thread at no more than the target rate, so a slow
+    #  display never holds up the capture
+    def __init__(self, fb, fps, appsink=None, size=None):
+        self.fb = fb
+        self.interval = 1.0 / fps
+        self.appsink = appsink
+        self.size = size
+        
+        self.cond = threading.Condition()
+        self.frame = None
+        self.next_time = 0
+        
+        self.shown = 0
+        self.skipped = 0
+        self.start = None
+        self.end = None
+    
+    def offer(self, image):
+        # called from the capture thread when there's no preview branch in the pipeline. frames are only
+        #  copied when they'll be shown, the rest are skipped
+        now = time.perf_counter()
+        with self.cond:
+            if now < self.next_time or self.frame is not None:
+                self.skipped += 1
+                return
+            self.next_time = now + self.interval
+            self.frame = image.copy()
+            self.cond.notify()
+    
+    def show(self, image):
+        if self.start is None:
+            self.start = time.perf_counter()
+        self.fb.write(image)
+        self.shown += 1
+        self.end = time.perf_counter()
+    
+    def run(self, stop):
+        try:
+            if self.appsink is not None:
+                # the pipeline delivers scaled frames at the preview rate
+                width, height = self.size
+                for idx, buffer, image in mapped_frames(pull_samples(self.appsink, stop), width, height):
+                    self.show(image)
+            else:
+                while not stop.is_set():
+                    with self.cond:
+                        self.cond.wait_for(lambda: self.frame is not None or stop.is_set(), 0.5)
+                        image, self.frame = self.frame, None
+                    if image is not None:
+                        self.show(image)
+        except Exception as e:
+            print(f"preview failed: {e}", flush=True)
+    
+    def report(self):
+        duration = (self.end - self.start) if self.shown > 1 else 0
+        fps = (self.shown - 1) / duration if duration > 0 else 0
+        return f"{self.shown} frames shown, {self.skipped} skipped, {fps:0.1f} fps"
+
+
+def preview(pipe, viewer):
+    for item in pipe:
+        viewer.offer(item['image'])
+        yield item
         
 
 def warmup(pipe, *, duration):
@@ -136,9 +214,14 @@ def warmup(pipe, *, duration):
         yield item
 
 
-def capture(pipe, cam_mode, capture_dir, num_images, time_delay):
+def write_image(path, image):
+    return cv2.imwrite(path, image)
+
+
+def capture(pipe, cam_mode, capture_dir, num_images, time_delay, writer, name="", verbose=True):
     
     fps = callib.maxfps_for_mode(cam_mode)
+    prefix = f"{name}: " if name else ""
     
     current_idx = 0
     current_loop = 0
@@ -150,23 +233,21 @@ def capture(pipe, cam_mode, capture_dir, num_images, time_delay):
         
         # check the time
         if current_loop < loop_max:
-            if current_loop == 0:
+            if verbose and current_loop == 0:
                 print(f"{current_idx:02d} waiting...", end="")
-            if current_loop % fps == 0:
+            if verbose and current_loop % fps == 0:
                 print(f"{current_loop:02d}...", end="", flush=True)
             current_loop += 1
             continue
-        print("")
+        if verbose:
+            print("")
     
-        # capture an image
-        print(f"{current_idx:02d} capturing...", flush=True)
-        image_width = item['width']
-        image_height = item['height']
-        image_data = item['data']
-        
-        image_array = np.ndarray((image_height, image_width, 4), np.uint8, image_data)
+        # hand a copy of the frame to the writer, the item's image is only valid until the next frame
         image_path = os.path.join(capture_dir, f"image_{current_idx:02d}.jpg")
-        cv2.imwrite(image_path, image_array)
+        if not writer.submit(image_path, item['image'].copy()):
+            # the writer is full, try again with the next frame
+            continue
+        print(f"{prefix}{current_idx:02d} capturing... (write queue {writer.depth()})", flush=True)
         
         current_idx += 1
         current_loop = 0
@@ -175,11 +256,116 @@ def capture(pipe, cam_mode, capture_dir, num_images, time_delay):
             break
 
 
-def build_pipeline(appsink, cam_mode, capture_dir, num_images, time_delay):
-    pipe = camera(appsink, cam_mode)
-    pipe = preview(pipe)
-    pipe = warmup(pipe, duration=5)
-    pipe = capture(pipe, cam_mode, capture_dir, num_images, time_delay)
+class AutoCapture:
+    # looks for the board on downscaled frames on a background thread, and saves a frame when the board
+    #  is in a pose that isn't covered yet
+    def __init__(self, capture_dir, grid_x, grid_y, imgsize, num_images, target_coverage, writer, scale=4, name=""):
+        self.capture_dir = capture_dir
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.num_images = num_images
+        self.target_coverage = target_coverage
+        self.writer = writer
+        self.scale = scale
+        self.prefix = f"{name}: " if name else ""
+        
+        self.tracker = CoverageTracker(grid_x, grid_y, imgsize)
+        self.cond = threading.Condition()
+        self.frame = None
+        self.done = threading.Event()
+        
+        self.checked = 0
+        self.detected = 0
+        self.saved = 0
+    
+    def offer(self, image):
+        # the frame is only copied when the detector is free to look at it, otherwise it's skipped
+        with self.cond:
+            if self.frame is not None:
+                return
+            self.frame = image.copy()
+            self.cond.notify()
+    
+    def check(self, frame):
+        h, w = frame.shape[:2]
+        small = frame
+        if self.scale > 1:
+            small = cv2.resize(frame, (w // self.scale, h // self.scale), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY)
+        
+        self.checked += 1
+        ret, corners = search_coarse(small, self.grid_x, self.grid_y, False)
+        if not ret:
+            return
+        self.detected += 1
+        
+        # the corners in full resolution coordinates are good enough to judge the pose
+        corners = (corners + 0.5) * self.scale - 0.5
+        if not self.tracker.accept(corners):
+            return
+        
+        image_path = os.path.join(self.capture_dir, f"image_{self.saved:02d}.jpg")
+        if not self.writer.submit(image_path, frame):
+            print(f"{self.prefix}write queue full, view dropped", flush=True)
+            return
+        
+        print(f"{self.prefix}{self.saved:02d} captured, coverage {self.tracker.coverage():0.0%} "
+              f"(board found in {self.detected} of {self.checked} frames checked, write queue {self.writer.depth()})", flush=True)
+        self.saved += 1
+        
+        if self.saved >= self.num_images or self.tracker.coverage() >= self.target_coverage:
+            self.done.set()
+    
+    def run(self):
+        while not self.done.is_set():
+            with self.cond:
+                self.cond.wait_for(lambda: self.frame is not None or self.done.is_set(), 0.5)
+                frame = self.frame
+            if frame is None:
+                continue
+            
+            try:
+                self.check(frame)
+            except Exception as e:
+                # stop the capture rather than leave the frame loop waiting on a detector that's gone
+                print(f"{self.prefix}auto capture failed: {e}", flush=True)
+                self.done.set()
+            finally:
+                with self.cond:
+                    self.frame = None
+
+
+def auto_capture(pipe, detector):
+    # the frame loop only hands frames over, the detection runs on its own thread
+    thread = threading.Thread(target=detector.run)
+    thread.start()
+    
+    try:
+        for item in pipe:
+            yield item
+            if detector.done.is_set():
+                break
+            detector.offer(item['image'])
+    
+    finally:
+        detector.done.set()
+        thread.join()
+
+
+def build_pipeline(appsink, cam_mode, capture_dir, num_images, time_delay, stop, writer, name="", primary=True, viewer=None, stats=None, detector=None, instrument=None):
+    # each stage is only wrapped when instrumenting, otherwise the stages are chained directly
+    stage = instrument.wrap if instrument is not None else lambda pipe, name: pipe
+    
+    # only the primary sensor drives the display and the countdown. the frames are only handed to the
+    #  preview here if the pipeline doesn't have its own preview branch
+    pipe = stage(camera(appsink, cam_mode, stop, stats), 'camera')
+    if viewer is not None and viewer.appsink is None:
+        pipe = stage(preview(pipe, viewer), 'preview')
+    pipe = stage(warmup(pipe, duration=5), 'warmup')
+    if detector is not None:
+        pipe = stage(auto_capture(pipe, detector), 'auto_capture')
+    else:
+        pipe = stage(capture(pipe, cam_mode, capture_dir, num_images, time_delay, writer, name, verbose=primary), 'capture')
     
     return pipe
 
@@ -199,45 +385,170 @@ def save_config(capture_dir, cam_mode):
         print(f"capture-height={cam_height}", file=f)
 
 
-def run(gpipe, pipe):
-
+def consume(pipe, stop):
     try:
-        gpipe.set_state(Gst.State.PLAYING)
         for item in pipe:
-            pass
+            if stop.is_set():
+                break
+    except Exception as e:
+        # one sensor failing stops them all
+        print(f"capture failed: {e}", flush=True)
+        stop.set()
+
+
+def run(sensors, stop, viewer=None):
+    # each sensor's generator chain is pulled on its own thread so the appsinks are read concurrently
+    threads = [threading.Thread(target=consume, args=(pipe, stop)) for gpipe, pipe in sensors]
+    
+    # the preview runs until the capture is done
+    preview_thread = None
+    if viewer is not None:
+        preview_thread = threading.Thread(target=viewer.run, args=(stop,))
+
+    try:
+        for gpipe, pipe in sensors:
+            gpipe.set_state(Gst.State.PLAYING)
+        if preview_thread is not None:
+            preview_thread.start()
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(0.5)
 
     except KeyboardInterrupt:
         pass
     
     finally:
-        gpipe.set_state(Gst.State.NULL)
-        gpipe.get_state(Gst.CLOCK_TIME_NONE)
+        stop.set()
+        for thread in threads:
+            if thread.is_alive():
+                thread.join()
+        if preview_thread is not None and preview_thread.is_alive():
+            preview_thread.join()
+        for gpipe, pipe in sensors:
+            gpipe.set_state(Gst.State.NULL)
+            gpipe.get_state(Gst.CLOCK_TIME_NONE)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-n', '--num-images', help='number of calibration of images to capture in timed-capture mode', type=int, default=5)
+    parser.add_argument('-n', '--num-images', help='number of calibration of images to capture in timed-capture mode (default: 5), the most to capture in auto mode (default: 30)', type=int, default=None)
     parser.add_argument('-t', '--time-delay', help='seconds between images in timed-capture mode', type=int, default=5)
+    parser.add_argument('-a', '--auto', help='capture when the board is found in a new pose instead of on a timer', action='store_true')
+    parser.add_argument('-x', '--grid-x', help='number of internal grid corners in x dimension (auto mode)', type=int, default=8)
+    parser.add_argument('-y', '--grid-y', help='number of internal grid corners in y dimension (auto mode)', type=int, default=6)
+    parser.add_argument('--coverage', help='fraction of the image the board has to have covered to finish in auto mode', type=float, default=0.75)
+    parser.add_argument('--auto-scale', help='downscale frames by this factor to look for the board in auto mode', choices=[1, 2, 4, 8], type=int, default=4)
     parser.add_argument('--hflip', help='horizontal flip (display only)', action='store_true')
     parser.add_argument('--vflip', help='vertical flip (display only)', action='store_true')
     parser.add_argument('-m', '--mode', help='the camera mode (default: 2)', choices=[0, 1, 2, 3, 4, 5], type=int, default=2)
+    parser.add_argument('-s', '--sensors', help='sensor ids of the cameras to capture from (default: 0)', type=int, nargs='+', default=[0])
+    parser.add_argument('--writer-threads', help='number of threads encoding and writing images', type=int, default=1)
+    parser.add_argument('--writer-queue', help='number of images that can wait to be written', type=int, default=4)
+    parser.add_argument('--drop-when-full', help='skip frames when the write queue is full instead of waiting', action='store_true')
+    parser.add_argument('--preview-fps', help='frame rate of the display preview, 0 to turn it off', type=int, default=15)
+    parser.add_argument('--cpu-preview', help='scale the preview on the cpu instead of in a pipeline branch', action='store_true')
+    parser.add_argument('--stats', help='time each pipeline stage and save a report to capture-stats.json', action='store_true')
+    parser.add_argument('--stats-every', help='seconds between stats summaries, 0 for only the report at the end', type=int, default=10)
+    parser.add_argument('--source', help='where the frames come from (default: argus, the camera)', choices=sources.BACKENDS, default='argus')
+    parser.add_argument('--location', help='the image directory or pattern, or the video file, for the dir and file sources', type=str, default=None)
+    parser.add_argument('--test-src', help='use a test pattern source in place of the camera, same as --source test', action='store_true')
     parser.add_argument('capture_root', help='root directory to save captured images', type=str)
     args = parser.parse_args()
     
+    # auto mode needs enough views to reach the coverage target before the count stops it
+    if args.num_images is None:
+        args.num_images = 30 if args.auto else 5
+    
     # the capture dir
     run_stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     capture_dir = os.path.join(args.capture_root, run_stamp)
     os.makedirs(capture_dir, exist_ok=True)
+    
+    backend = 'test' if args.test_src else args.source
+    
+    # images are encoded and written in the background so the frame loop never waits on the disk
+    writer = BackgroundWriter(write_image, args.writer_threads, args.writer_queue, block=not args.drop_when_full)
+    
+    # the preview is shown at the size it fills on the display, so the pipeline can scale it down
+    fb, preview_size = None, None
+    if args.preview_fps > 0:
+        # off the jetson, eg with the stand-in sources, there may be no framebuffer to preview on
+        try:
+            fb = Framebuffer("/dev/fb0")
+        except (OSError, ValueError) as e:
+            print(f"no framebuffer for the preview, running without it: {e}", flush=True)
+    if fb is not None:
+        _, cam_width, cam_height = callib.size_for_mode(args.mode)
+        _, _, preview_width, preview_height = letterbox(cam_width, cam_height, fb.width, fb.height)
+        if not args.cpu_preview:
+            preview_size = (preview_width, preview_height)
+    
+    # build a pipeline per sensor, each saving to its own directory if there's more than one
+    stop = threading.Event()
+    sensors = []
+    sensor_dirs = []
+    sensor_stats = []
+    instruments = []
+    viewer = None
+    for idx, sensor_id in enumerate(args.sensors):
+        sensor_dir = capture_dir
+        if len(args.sensors) > 1:
+            sensor_dir = os.path.join(capture_dir, f"sensor{sensor_id}")
+            os.makedirs(sensor_dir, exist_ok=True)
+        
+        primary = idx == 0
+        gpipe, appsink, preview_sink = build_gst_pipeline(args.mode, args.hflip, args.vflip, sensor_id, backend, args.location,
+                                                          preview_size if primary else None, args.preview_fps)
+        if not gpipe:
+            return
+        if primary and fb is not None:
+            viewer = Preview(fb, args.preview_fps, preview_sink, preview_size)
         
-    # run the capture
-    gpipe, appsink = build_gst_pipeline(args.mode, args.hflip, args.vflip)
-    if not gpipe:
-        return
+        name = f"sensor{sensor_id}" if len(args.sensors) > 1 else ""
+        stats = {}
+        detector = None
+        if args.auto:
+            _, cam_width, cam_height = callib.size_for_mode(args.mode)
+            detector = AutoCapture(sensor_dir, args.grid_x, args.grid_y, (cam_height, cam_width), args.num_images,
+                                   args.coverage, writer, args.auto_scale, name)
+        instrument = None
+        if args.stats:
+            instrument = Instrument(name, callib.maxfps_for_mode(args.mode), args.stats_every)
+            instruments.append(instrument)
+        pipe = build_pipeline(appsink, args.mode, sensor_dir, args.num_images, args.time_delay, stop, writer, name, primary,
+                              viewer if primary else None, stats, detector, instrument)
+        sensors.append((gpipe, pipe))
+        sensor_dirs.append(sensor_dir)
+        sensor_stats.append((name or f"sensor{sensor_id}", stats))
+    
+    # run the capture, and wait for every image to be on disk before saving the config
+    run(sensors, stop, viewer)
+    
+    print("flushing images...", flush=True)
+    writer.close()
+    print(f"writer: {writer.report()}")
+    
+    # the rates actually achieved, to check the preview isn't holding up the capture
+    for name, stats in sensor_stats:
+        frames = stats.get('frames', 0)
+        duration = stats['end'] - stats['start'] if frames > 1 else 0
+        fps = (frames - 1) / duration if duration > 0 else 0
+        print(f"{name}: {frames} frames, {fps:0.1f} fps")
+    if viewer is not None:
+        print(f"preview: {viewer.report()}")
+        fb.close()
     
-    pipe = build_pipeline(appsink, args.mode, capture_dir, args.num_images, args.time_delay)
-    run(gpipe, pipe)
+    if instruments:
+        for instrument in instruments:
+            print(instrument.summary())
+        stats_file = os.path.join(capture_dir, "capture-stats.json")
+        save_report(stats_file, instruments)
+        print(f"stats saved to {stats_file}")
     
-    save_config(capture_dir, args.mode)
+    for sensor_dir in sensor_dirs:
+        save_config(sensor_dir, args.mode)
 
 
 if __name__ == "__main__":
@@ -3,8 +3,10 @@ import sys, re
 import argparse
 import os
 import time
+import signal
+import socket
+import threading
 from datetime import datetime
-import configparser
 
 import gi
 gi.require_version('Gst', '1.0')
@@ -13,6 +15,9 @@ gi.require_version("GstApp", "1.0")
 from gi.repository import GLib, Gst, GstApp
 
 import callib
+from callib import sources
+from callib.writer import BackgroundWriter, FSYNC_POLICIES
+from callib.ring import FrameRing
 
 
 ## functions to build pipeline
@@ -46,28 +51,37 @@ def link_nodes(name, pipe, nodes):
     return True
 
 
-def build_pipeline(camera_mode, cam_width, cam_height, cam_calfile):
+def build_head(camera_mode, cam_width, cam_height, cam_calfile, backend='argus', location=None, cpu_dewarp=False):
     
-    # create the pipeline
-    pipe = Gst.Pipeline.new('recorder')
-    
-    # the viewer path
+    # the viewer path, the source is the camera or one of the stand-ins for it. returns a list of
+    #  chains, split around a cpu dewarp stage, and the rest of the pipeline goes on the last one
+    chains = []
     nodes = []    
     
-    node = Gst.ElementFactory.make('nvarguscamerasrc')
-    nodes.append(node)
-    Gst.util_set_object_arg(node, "sensor-id", "0")
-    Gst.util_set_object_arg(node, "bufapi-version", "true")
-    Gst.util_set_object_arg(node, "sensor-mode", f"{camera_mode}")
-    
-    node = Gst.ElementFactory.make('capsfilter')
+    node = sources.make_source(backend, camera_mode, 0, location)
     nodes.append(node)
-    Gst.util_set_object_arg(node, "caps", f"video/x-raw(memory:NVMM), width=(int){cam_width}, height=(int){cam_height}, format=(string)NV12")
         
-    node = Gst.ElementFactory.make('nvvideoconvert')
+    node = sources.make_convert(backend)
     nodes.append(node)
 
     if cam_calfile is not None:
+        # nvdewarper can only read its own config
+        from callib.model import is_calibration
+        cpu_dewarp = cpu_dewarp or is_calibration(cam_calfile)
+    
+    if cam_calfile is not None and (cpu_dewarp or not sources.is_device(backend)):
+        # nvdewarper needs the argus source and its config, otherwise the frames are dewarped on the cpu
+        node = Gst.ElementFactory.make('capsfilter')
+        nodes.append(node)
+        Gst.util_set_object_arg(node, "caps", f"video/x-raw, width=(int){cam_width}, height=(int){cam_height}, format=(string)BGRx")
+        
+        appsink, appsrc = sources.make_bridge_ends(cam_width, cam_height, callib.maxfps_for_mode(camera_mode))
+        nodes.append(appsink)
+        chains.append(nodes)
+        
+        nodes = [appsrc, sources.make_convert(backend)]
+    
+    elif cam_calfile is not None:
         node = Gst.ElementFactory.make('capsfilter')
         nodes.append(node)
         Gst.util_set_object_arg(node, "caps", f"video/x-raw(memory:NVMM), width=(int){cam_width}, height=(int){cam_height}, format=(string)RGBA")
@@ -80,20 +94,89 @@ def build_pipeline(camera_mode, cam_width, cam_height, cam_calfile):
 
         node = Gst.ElementFactory.make('nvvideoconvert')
         nodes.append(node)
+    
+    chains.append(nodes)
+    return chains
+
 
-    node = Gst.ElementFactory.make('pngenc')
+def build_pipeline(camera_mode, cam_width, cam_height, cam_calfile, backend='argus', location=None, cpu_dewarp=False, encoder='pngenc'):
+    
+    # create the pipeline
+    pipe = Gst.Pipeline.new('recorder')
+    
+    chains = build_head(camera_mode, cam_width, cam_height, cam_calfile, backend, location, cpu_dewarp)
+    nodes = chains[-1]
+
+    node = Gst.ElementFactory.make(encoder)
     nodes.append(node)
 
     sink = node = Gst.ElementFactory.make('appsink')
     nodes.append(node)
     Gst.util_set_object_arg(node, "emit-signals", "true")
     
-    if link_nodes("Recorder Pipeine", pipe, nodes) == False:
-        return None, None
+    for nodes in chains:
+        if link_nodes("Recorder Pipeine", pipe, nodes) == False:
+            return None, None
     
     return pipe, sink
 
 
+def build_video_pipeline(camera_mode, cam_width, cam_height, cam_calfile, capture_dir, video, backend='argus', location=None, cpu_dewarp=False):
+    
+    # create the pipeline
+    pipe = Gst.Pipeline.new('recorder')
+    
+    chains = build_head(camera_mode, cam_width, cam_height, cam_calfile, backend, location, cpu_dewarp)
+    nodes = chains[-1]
+    
+    # the hardware encoder takes frames in device memory, the software encoder in system memory
+    encoder = video['encoder']
+    if encoder == 'auto':
+        encoder = 'nvv4l2h264enc' if sources.is_device(backend) else 'x264enc'
+    if encoder == 'nvv4l2h264enc' and not sources.is_device(backend):
+        print("nvv4l2h264enc needs the argus source")
+        return None
+    
+    node = Gst.ElementFactory.make('capsfilter')
+    nodes.append(node)
+    if encoder == 'nvv4l2h264enc':
+        Gst.util_set_object_arg(node, "caps", "video/x-raw(memory:NVMM), format=(string)I420")
+    else:
+        Gst.util_set_object_arg(node, "caps", "video/x-raw, format=(string)I420")
+
+    # named so the frames going into it can be counted
+    node = Gst.ElementFactory.make(encoder, 'encoder')
+    nodes.append(node)
+    if encoder == 'nvv4l2h264enc':
+        Gst.util_set_object_arg(node, "bitrate", f"{video['bitrate'] * 1000}")
+    else:
+        Gst.util_set_object_arg(node, "bitrate", f"{video['bitrate']}")
+        Gst.util_set_object_arg(node, "speed-preset", "ultrafast")
+        Gst.util_set_object_arg(node, "tune", "zerolatency")
+    
+    # a keyframe every second so segments can be split close to their target length
+    fps = callib.maxfps_for_mode(camera_mode)
+    Gst.util_set_object_arg(node, "iframeinterval" if encoder == 'nvv4l2h264enc' else "key-int-max", f"{fps}")
+    
+    node = Gst.ElementFactory.make('h264parse')
+    nodes.append(node)
+    
+    # splitmuxsink starts a new file at the first keyframe after a segment reaches its time or size limit
+    sink = node = Gst.ElementFactory.make('splitmuxsink')
+    nodes.append(node)
+    Gst.util_set_object_arg(node, "location", os.path.join(capture_dir, f"video%05d.{video['container']}"))
+    Gst.util_set_object_arg(node, "max-size-time", f"{video['segment_seconds'] * Gst.SECOND}")
+    Gst.util_set_object_arg(node, "max-size-bytes", f"{video['segment_mb'] * 1024 * 1024}")
+    muxer = Gst.ElementFactory.make('mp4mux' if video['container'] == 'mp4' else 'matroskamux')
+    node.set_property("muxer", muxer)
+    
+    for nodes in chains:
+        if link_nodes("Recorder Pipeine", pipe, nodes) == False:
+            return None
+    
+    return pipe
+
+
 ## callback function for the bus
 
 def bus_cb(bus, message, loop):
@@ -109,6 +192,49 @@ def bus_cb(bus, message, loop):
     return True
 
 
+## probe on the source's output
+
+def buffer_time(buffer):
+    # frames are timed by their timestamps, so a file source that runs faster than real time is still
+    #  sampled every delay seconds of video, and by the arrival time without them
+    if buffer.pts == Gst.CLOCK_TIME_NONE:
+        return time.monotonic()
+    return buffer.pts / Gst.SECOND
+
+
+def due(tracker, ts):
+    # the first frame starts the clock, with a few seconds for the camera to settle
+    if tracker['next'] is None:
+        tracker['next'] = ts + tracker['warmup']
+    return ts >= tracker['next']
+
+
+def gate_cb(pad, info, tracker):
+    
+    # only a frame that's due to be saved goes on to be converted and encoded, the rest are dropped here
+    if tracker['pending'] or not due(tracker, buffer_time(info.get_buffer())):
+        if not tracker['pending']:
+            print(".", end="", flush=True)
+        return Gst.PadProbeReturn.DROP
+    
+    tracker['pending'] = True
+    return Gst.PadProbeReturn.OK
+
+
+## writing the images
+
+def write_buffer(path, buffer):
+    ok, info = buffer.map(Gst.MapFlags.READ)
+    if not ok:
+        return False
+    try:
+        with open(path, "wb") as f:
+            f.write(info.data)
+    finally:
+        buffer.unmap(info)
+    return True
+
+
 ## callback function for the appsink
 
 def newsample_cb(appsink, tracker):
@@ -117,24 +243,29 @@ def newsample_cb(appsink, tracker):
     sample = appsink.pull_sample()
     if sample is None:
         return Gst.FlowReturn.OK
+    tracker['encoded'] += 1
     
-    # check the timeout
-    if time.time() < tracker['next']:
+    # check the timeout, only needed when the frames aren't gated
+    ts = buffer_time(sample.get_buffer())
+    if not due(tracker, ts):
         print(".", end="", flush=True)
         return Gst.FlowReturn.OK
     print("")
     
-    # save the image
+    # hand the encoded buffer to the writer, the file is written on the writer's thread so slow
+    #  storage doesn't hold up the pipeline
     name = os.path.join(tracker['capture_dir'], f"image{tracker['count']:04d}.png")
-    print(f"saving image to {name}", flush=True)
-
-    buffer = sample.get_buffer()
-    data = buffer.extract_dup(0, buffer.get_size())
-    with open(name, "wb") as f:
-        f.write(data)
+    writer = tracker['writer']
+    if not writer.submit(name, sample.get_buffer()):
+        # the queue is full, the gate lets the next frame through to try again
+        print(f"write queue full, dropped {name}", flush=True)
+        tracker['pending'] = False
+        return Gst.FlowReturn.OK
+    print(f"saving image to {name} (write queue {writer.depth()})", flush=True)
         
     tracker['count'] = tracker['count'] + 1
-    tracker['next'] = time.time() + tracker['delay']
+    tracker['next'] = ts + tracker['delay']
+    tracker['pending'] = False
 
     if tracker['count'] >= tracker['total']:
         tracker['loop'].quit()
@@ -142,9 +273,198 @@ def newsample_cb(appsink, tracker):
     return Gst.FlowReturn.OK
 
 
+## callbacks for video recording
+
+def video_bus_cb(bus, message, loop):
+    # splitmuxsink posts a message as each segment is finished
+    if message.type == Gst.MessageType.ELEMENT:
+        st = message.get_structure()
+        if st is not None and st.get_name() == "splitmuxsink-fragment-closed":
+            print(f"segment closed: {st.get_string('location')}", flush=True)
+        return True
+
+    return bus_cb(bus, message, loop)
+
+
+def count_cb(pad, info, stats):
+    if stats['start'] is None:
+        stats['start'] = time.time()
+    stats['frames'] += 1
+    return Gst.PadProbeReturn.OK
+
+
+def video_report(stats):
+    # the disk rate is from the size of the segment files written so far
+    elapsed = time.time() - stats['start'] if stats['start'] is not None else 0
+    files = [os.path.join(stats['capture_dir'], f) for f in os.listdir(stats['capture_dir']) if f.startswith("video")]
+    mbytes = sum(os.path.getsize(f) for f in files) / (1024*1024)
+    
+    fps = stats['frames'] / elapsed if elapsed > 0 else 0
+    rate = mbytes / elapsed if elapsed > 0 else 0
+    return f"{stats['frames']} frames, {fps:0.1f} fps, {len(files)} segments, {mbytes:0.1f} MB, {rate:0.2f} MB/s"
+
+
+def report_cb(stats):
+    print(video_report(stats), flush=True)
+    return True
+
+
+def stop_cb(pipe):
+    # end of stream finishes the last segment properly before the loop quits
+    print("stopping...", flush=True)
+    pipe.send_event(Gst.Event.new_eos())
+    return False
+
+
+## callbacks for the pre-trigger ring buffer
+
+def ring_sample_cb(appsink, events):
+    
+    sample = appsink.pull_sample()
+    if sample is None:
+        return Gst.FlowReturn.OK
+    buffer = sample.get_buffer()
+    ts = buffer_time(buffer)
+    
+    # frames go into the ring, or straight to the writer while an event is being recorded
+    path = None
+    with events['lock']:
+        events['last'] = ts
+        active = events['active']
+        if active is not None and ts > active['until']:
+            print(f"event {active['name']}: {active['index']} frames", flush=True)
+            events['active'] = active = None
+        
+        if active is None:
+            events['ring'].add(ts, buffer.get_size(), buffer)
+        else:
+            path = os.path.join(active['dir'], f"frame{active['index']:05d}.{events['ext']}")
+            active['index'] += 1
+    
+    if path is not None and not events['writer'].submit(path, buffer):
+        print(f"write queue full, dropped {path}", flush=True)
+    
+    return Gst.FlowReturn.OK
+
+
+def dump_frames(events, name, path, frames):
+    
+    # the ring is written on its own writer so it doesn't wait behind, or hold up, the live frames
+    dumper = BackgroundWriter(write_buffer, events['dump_threads'], events['dump_queue'])
+    start = time.perf_counter()
+    for idx, (ts, size, buffer) in enumerate(frames):
+        dumper.submit(os.path.join(path, f"frame{idx:05d}.{events['ext']}"), buffer)
+    dumper.close()
+    elapsed = time.perf_counter() - start
+    
+    mbytes = sum(size for ts, size, buffer in frames) / (1024*1024)
+    rate = mbytes / elapsed if elapsed > 0 else 0
+    fps = len(frames) / elapsed if elapsed > 0 else 0
+    dump = {'event': name, 'frames': len(frames), 'mbytes': mbytes, 'seconds': elapsed}
+    events['dumps'].append(dump)
+    print(f"event {name}: dumped {len(frames)} frames, {mbytes:0.1f} MB in {elapsed:0.2f} s, "
+          f"{rate:0.1f} MB/s, {fps:0.1f} frames/s", flush=True)
+
+
+def trigger(events, source):
+    
+    with events['lock']:
+        # a trigger during an event extends it, the frames since are already going to disk
+        active = events['active']
+        if active is not None:
+            active['until'] = events['last'] + events['post']
+            print(f"event {active['name']}: extended by {source}", flush=True)
+            return active['name']
+        
+        frames = events['ring'].take()
+        name = f"event{len(events['threads']):03d}"
+        path = os.path.join(events['capture_dir'], name)
+        os.makedirs(path, exist_ok=True)
+        events['active'] = {
+            'name': name,
+            'dir': path,
+            'until': (events['last'] or 0) + events['post'],
+            'index': len(frames),
+        }
+    
+    span = frames[-1][0] - frames[0][0] if len(frames) > 1 else 0
+    print(f"event {name}: triggered by {source}, dumping {len(frames)} frames from the last {span:0.1f} s", flush=True)
+    thread = threading.Thread(target=dump_frames, args=(events, name, path, frames))
+    events['threads'].append(thread)
+    thread.start()
+    return name
+
+
+def signal_cb(events):
+    trigger(events, "SIGUSR1")
+    return True
+
+
+def stdin_cb(stream, condition, events):
+    # enter triggers an event, q then enter stops
+    line = stream.readline()
+    if line.strip() == 'q' or not line:
+        events['loop'].quit()
+        return False
+    
+    trigger(events, "keypress")
+    return True
+
+
+def socket_cb(fd, condition, events):
+    
+    # one command per connection: trigger, or status for the ring's memory use
+    conn, _ = events['socket'].accept()
+    with conn:
+        conn.settimeout(1)
+        try:
+            command = conn.recv(64).decode().strip()
+        except (OSError, UnicodeDecodeError):
+            return True
+        
+        if command == 'trigger':
+            reply = trigger(events, "socket")
+        elif command == 'status':
+            reply = events['ring'].report()
+        else:
+            reply = f"unknown command: {command}"
+        
+        try:
+            conn.sendall(f"{reply}\n".encode())
+        except OSError:
+            pass
+    
+    return True
+
+
+def ring_report_cb(events):
+    print(f"ring: {events['ring'].report()}", flush=True)
+    return True
+
+
+def open_socket(path):
+    # a stale socket from an earlier run is replaced
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(4)
+    return sock
+
+
 ## run the application
 
-def run(pipe, sink, capture_dir, num_images, delay):
+def make_bridge(pipe, calfile, threads):
+    # the cpu dewarp loads the calibration saved alongside the config. it pulls in opencv and numpy,
+    #  so it's only imported when the pipeline has one
+    if not sources.has_bridge(pipe):
+        return None
+    
+    from callib.bridge import make_dewarp_bridge
+    return make_dewarp_bridge(pipe, calfile, threads)
+
+
+def run(pipe, sink, capture_dir, num_images, delay, gate=True, writer=None, bridge=None):
     
     bus = pipe.get_bus()
     bus.add_signal_watch()
@@ -157,23 +477,165 @@ def run(pipe, sink, capture_dir, num_images, delay):
         'count': 0,
         'total': num_images,
         'delay': delay,
-        'next': time.time() + 5,
+        'next': None,
+        'warmup': 5,
         'capture_dir': capture_dir,
-        'loop': loop
+        'loop': loop,
+        'pending': False,
+        'encoded': 0,
+        'writer': writer or BackgroundWriter(write_buffer),
     }
     sink.connect("new-sample", newsample_cb, tracker)
     
+    # the frames are gated as they leave the source so only the ones that are saved get encoded
+    if gate:
+        pad = pipe.get_by_name('source0').get_static_pad('src')
+        pad.add_probe(Gst.PadProbeType.BUFFER, gate_cb, tracker)
+    
+    try:
+        pipe.set_state(Gst.State.PLAYING)
+        if bridge is not None:
+            bridge.start()
+        loop.run()
+        
+    except KeyboardInterrupt:
+        pass
+    
+    if bridge is not None:
+        bridge.close()
+        print(f"dewarp: {bridge.report()}")
+    
+    # every image is on disk before the pipeline, and the buffers the writer holds, are torn down
+    print("\nflushing images...", flush=True)
+    tracker['writer'].close()
+    print(f"writer: {tracker['writer'].report()}")
+    
+    pipe.set_state(Gst.State.NULL)
+    pipe.get_state(Gst.CLOCK_TIME_NONE)
+    
+    return tracker
+
+
+def run_ring(pipe, sink, capture_dir, ring, post, ext, writer, report_every=10, socket_path=None, dump_threads=1, bridge=None):
+    
+    bus = pipe.get_bus()
+    bus.add_signal_watch()
+    
+    # create the main loop and connect the message callback
+    loop = GLib.MainLoop()
+    bus.connect("message", bus_cb, loop)
+    
+    events = {
+        'ring': ring,
+        'post': post,
+        'ext': ext,
+        'capture_dir': capture_dir,
+        'writer': writer,
+        'dump_threads': dump_threads,
+        'dump_queue': 4 * dump_threads,
+        'lock': threading.Lock(),
+        'last': None,
+        'active': None,
+        'threads': [],
+        'dumps': [],
+        'loop': loop,
+        'socket': None,
+    }
+    sink.connect("new-sample", ring_sample_cb, events)
+    
+    # the triggers: a signal, enter on the terminal, or a command on a unix socket
+    GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR1, signal_cb, events)
+    print(f"trigger with: kill -USR1 {os.getpid()}", flush=True)
+    if sys.stdin.isatty():
+        GLib.io_add_watch(sys.stdin, GLib.PRIORITY_DEFAULT, GLib.IO_IN, stdin_cb, events)
+        print("trigger with: enter, q then enter to stop", flush=True)
+    if socket_path is not None:
+        events['socket'] = open_socket(socket_path)
+        GLib.io_add_watch(events['socket'].fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, socket_cb, events)
+        print(f"trigger with: echo trigger | nc -U {socket_path}", flush=True)
+    if report_every > 0:
+        GLib.timeout_add_seconds(report_every, ring_report_cb, events)
+    
     try:
         pipe.set_state(Gst.State.PLAYING)
+        if bridge is not None:
+            bridge.start()
         loop.run()
         
     except KeyboardInterrupt:
         pass
     
+    if events['socket'] is not None:
+        events['socket'].close()
+        os.unlink(socket_path)
+    
+    if bridge is not None:
+        bridge.close()
+        print(f"dewarp: {bridge.report()}")
+    
+    # the dumps and the frames after the events are on disk before the buffers are torn down
+    print("\nflushing events...", flush=True)
+    for thread in events['threads']:
+        thread.join()
+    writer.close()
+    print(f"writer: {writer.report()}")
+    print(f"ring: {ring.report()}")
+    
+    dumps = events['dumps']
+    if dumps:
+        mbytes = sum(d['mbytes'] for d in dumps)
+        seconds = sum(d['seconds'] for d in dumps)
+        print(f"{len(dumps)} events dumped, {mbytes:0.1f} MB at {mbytes / seconds if seconds > 0 else 0:0.1f} MB/s")
+    
+    pipe.set_state(Gst.State.NULL)
+    pipe.get_state(Gst.CLOCK_TIME_NONE)
+    
+    return events
+
+
+def run_video(pipe, capture_dir, duration, report_every, bridge=None):
+    
+    bus = pipe.get_bus()
+    bus.add_signal_watch()
+    
+    # create the main loop and connect the message callback
+    loop = GLib.MainLoop()
+    bus.connect("message", video_bus_cb, loop)
+    
+    stats = {
+        'frames': 0,
+        'start': None,
+        'capture_dir': capture_dir,
+    }
+    pad = pipe.get_by_name('encoder').get_static_pad('sink')
+    pad.add_probe(Gst.PadProbeType.BUFFER, count_cb, stats)
+    
+    if report_every > 0:
+        GLib.timeout_add_seconds(report_every, report_cb, stats)
+    if duration > 0:
+        GLib.timeout_add_seconds(duration, stop_cb, pipe)
+    
+    try:
+        pipe.set_state(Gst.State.PLAYING)
+        if bridge is not None:
+            bridge.start()
+        loop.run()
+        
+    except KeyboardInterrupt:
+        # wait for the end of stream to get through so the last segment is readable
+        stop_cb(pipe)
+        GLib.timeout_add_seconds(5, loop.quit)
+        loop.run()
+    
+    if bridge is not None:
+        bridge.close()
+        print(f"dewarp: {bridge.report()}")
+    
     pipe.set_state(Gst.State.NULL)
     pipe.get_state(Gst.CLOCK_TIME_NONE)
     
-    return 0
+    print(video_report(stats))
+    return stats
 
 
 def main():
@@ -190,17 +652,41 @@ def main():
                             nargs='?',
                             help='the camera mode (default: 2)', 
                         )
+    parser.add_argument('--writer-queue', help='number of images that can wait to be written', type=int, default=4)
+    parser.add_argument('--write-batch', help='most images to write together before syncing', type=int, default=1)
+    parser.add_argument('--fsync', help='when to flush written images to the storage', choices=FSYNC_POLICIES, default='none')
+    parser.add_argument('--drop-when-full', help='skip images when the write queue is full instead of waiting', action='store_true')
+    parser.add_argument('--video', help='record continuous video in segments instead of images', action='store_true')
+    parser.add_argument('--encoder', help='the h264 encoder for video, auto picks the hardware encoder with the camera', choices=['auto', 'nvv4l2h264enc', 'x264enc'], default='auto')
+    parser.add_argument('--bitrate', help='video bitrate in kbit/s', type=int, default=8000)
+    parser.add_argument('--container', help='video file format', choices=['mkv', 'mp4'], default='mkv')
+    parser.add_argument('--segment-seconds', help='start a new video file after this many seconds', type=int, default=60)
+    parser.add_argument('--segment-mb', help='start a new video file after this many MB, 0 for no limit', type=int, default=0)
+    parser.add_argument('--duration', help='seconds of video to record, 0 to record until interrupted', type=int, default=0)
+    parser.add_argument('--report-every', help='seconds between video recording reports, 0 for none', type=int, default=10)
+    parser.add_argument('--ring', help='keep this many seconds of frames in memory and save them when triggered, 0 for off', type=float, default=0)
+    parser.add_argument('--ring-mb', help='most memory the ring of frames can use, in MB', type=int, default=256)
+    parser.add_argument('--ring-format', help='how the frames in the ring are compressed', choices=['jpeg', 'png'], default='jpeg')
+    parser.add_argument('--post-seconds', help='seconds of frames to save after a trigger', type=float, default=5)
+    parser.add_argument('--dump-threads', help='number of threads writing out the ring on a trigger', type=int, default=2)
+    parser.add_argument('--trigger-socket', help='unix socket path that accepts trigger and status commands', type=str, default=None)
+    parser.add_argument('--source', help='where the frames come from (default: argus, the camera)', choices=sources.BACKENDS, default='argus')
+    parser.add_argument('--location', help='the image directory or pattern, or the video file, for the dir and file sources', type=str, default=None)
+    parser.add_argument('--cpu-dewarp', help='undistort on the cpu with the remap tables instead of with nvdewarper', action='store_true')
+    parser.add_argument('--dewarp-threads', help='number of threads for the cpu dewarp', type=int, default=4)
     parser.add_argument('capture_root', help='root directory to save captured images', type=str)
-    parser.add_argument('calconfig', help='calibration config file', type=str, nargs='?', default=None)
+    parser.add_argument('calconfig', help='calibration config file, or cal-raw.xml or cal-model.npz for the cpu dewarp', type=str, nargs='?', default=None)
     args = parser.parse_args()
     
     # get the camera mode
     #  order: command line, calibration file, default
     camera_mode = args.mode
     if camera_mode is None and args.calconfig is not None:
-        config = configparser.ConfigParser()
-        config.read(args.calconfig)
-        camera_mode = config['property'].get('camera-mode', None)
+        # the calibration file helpers are with the camera model, which pulls in opencv and numpy
+        from callib.model import read_calconfig
+        config = read_calconfig(args.calconfig)
+        if config is not None:
+            camera_mode = config.get('camera-mode', None)
 
     camera_mode, cam_width, cam_height = callib.size_for_mode(camera_mode)
     
@@ -209,12 +695,58 @@ def main():
     capture_dir = os.path.join(args.capture_root, run_stamp)
     os.makedirs(capture_dir, exist_ok=True)
     
-    pipe, sink = build_pipeline(camera_mode, cam_width, cam_height, args.calconfig)
+    if args.video:
+        video = {
+            'encoder': args.encoder,
+            'bitrate': args.bitrate,
+            'container': args.container,
+            'segment_seconds': args.segment_seconds,
+            'segment_mb': args.segment_mb,
+        }
+        pipe = build_video_pipeline(camera_mode, cam_width, cam_height, args.calconfig, capture_dir, video, args.source, args.location, args.cpu_dewarp)
+        if pipe is None:
+            return 1
+        
+        try:
+            bridge = make_bridge(pipe, args.calconfig, args.dewarp_threads)
+        except (ValueError, FileNotFoundError) as e:
+            print(e)
+            return 1
+        run_video(pipe, capture_dir, args.duration, args.report_every, bridge)
+        return 0
+    
+    if args.ring > 0:
+        # every frame is encoded so the ring holds compressed buffers, the writer holds the frames
+        #  after a trigger
+        encoder = 'jpegenc' if args.ring_format == 'jpeg' else 'pngenc'
+        pipe, sink = build_pipeline(camera_mode, cam_width, cam_height, args.calconfig, args.source, args.location, args.cpu_dewarp, encoder)
+        if pipe is None:
+            return 1
+        
+        try:
+            bridge = make_bridge(pipe, args.calconfig, args.dewarp_threads)
+        except (ValueError, FileNotFoundError) as e:
+            print(e)
+            return 1
+        ring = FrameRing(args.ring_mb * 1024 * 1024, args.ring)
+        writer = BackgroundWriter(write_buffer, 1, args.writer_queue, not args.drop_when_full, args.write_batch, args.fsync)
+        ext = 'jpg' if args.ring_format == 'jpeg' else 'png'
+        run_ring(pipe, sink, capture_dir, ring, args.post_seconds, ext, writer, args.report_every, args.trigger_socket, args.dump_threads, bridge)
+        return 0
+    
+    pipe, sink = build_pipeline(camera_mode, cam_width, cam_height, args.calconfig, args.source, args.location, args.cpu_dewarp)
 
     if pipe is None:
         return 1
     
-    run(pipe, sink, capture_dir, args.num_images, args.time_delay)
+    # the gate is ahead of the cpu dewarp, so only the frames that are saved get dewarped
+    try:
+        bridge = make_bridge(pipe, args.calconfig, args.dewarp_threads)
+    except (ValueError, FileNotFoundError) as e:
+        print(e)
+        return 1
+    writer = BackgroundWriter(write_buffer, 1, args.writer_queue, not args.drop_when_full, args.write_batch, args.fsync)
+    run(pipe, sink, capture_dir, args.num_images, args.time_delay, writer=writer, bridge=bridge)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import sys, os
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from callib.undistort import undistort
+from callib.model import find_model
+
+
+def find_images(input_dir, output_dir, extensions):
+    # mirror the input tree, skipping the images already done
+    todo = []
+    skipped = 0
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            base, ext = os.path.splitext(name)
+            # partial images are left by a run that was killed while writing
+            if ext.lower() not in extensions or base.endswith(".partial"):
+                continue
+            src = os.path.join(root, name)
+            dst = os.path.join(output_dir, os.path.relpath(src, input_dir))
+            if os.path.exists(dst):
+                skipped += 1
+                continue
+            todo.append((src, dst))
+
+    return todo, skipped
+
+
+def get_maps(calfile, imgsize):
+    # the calibration is scaled to the image size, or refused if it can't be
+    h, w = imgsize
+    model = find_model(calfile, w, h)
+    if model.map1 is not None:
+        print("using the saved maps")
+    return model.maps()
+
+
+def process(src, dst, map1, map2):
+    img = cv2.imread(src)
+    if img is None:
+        return False
+    if img.shape[:2] != map1.shape[:2]:
+        return False
+
+    dst_img = undistort(img, map1, map2)
+
+    # write to the side and rename so a stopped run never leaves a partial image to be skipped
+    base, ext = os.path.splitext(dst)
+    tmpfile = f"{base}.partial{ext}"
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        if not cv2.imwrite(tmpfile, dst_img):
+            return False
+        os.replace(tmpfile, dst)
+    finally:
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+    return True
+
+
+def run(todo, map1, map2, threads):
+    # opencv releases the GIL while decoding, remapping and encoding so the threads run in parallel
+    start = time.time()
+    done = failed = 0
+
+    with ThreadPoolExecutor(threads) as executor:
+        results = executor.map(lambda job: process(job[0], job[1], map1, map2), todo)
+        for (src, dst), ok in zip(todo, results):
+            if ok:
+                done += 1
+            else:
+                failed += 1
+                print(f"failed to undistort {src}")
+
+            if (done + failed) % 50 == 0:
+                duration = time.time() - start
+                print(f"{done + failed}/{len(todo)} images, {(done + failed)/duration:0.1f} fps", flush=True)
+
+    duration = time.time() - start
+    return done, failed, duration
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-j', '--threads', help='number of worker threads', type=int, default=os.cpu_count())
+    parser.add_argument('-e', '--extensions', help='image file extensions to process', type=str, nargs='+', default=['.jpg', '.png'])
+    parser.add_argument('calfile', help='calibration file (cal-raw.xml or cal-model.npz)', type=str)
+    parser.add_argument('input_dir', help='directory of images to undistort', type=str)
+    parser.add_argument('output_dir', help='directory to write the undistorted images to', type=str)
+    args = parser.parse_args()
+
+    extensions = [ext.lower() if ext.startswith('.') else f".{ext.lower()}" for ext in args.extensions]
+    todo, skipped = find_images(args.input_dir, args.output_dir, extensions)
+    print(f"found {len(todo)} images to undistort, {skipped} already done")
+    if len(todo) == 0:
+        return 0
+
+    # the maps are built for the size of the first image
+    img = cv2.imread(todo[0][0])
+    if img is None:
+        print(f"failed to read {todo[0][0]}")
+        return 1
+    try:
+        map1, map2 = get_maps(args.calfile, img.shape[:2])
+    except (ValueError, FileNotFoundError) as e:
+        print(e)
+        return 1
+
+    if args.threads > 1:
+        cv2.setNumThreads(1)
+
+    done, failed, duration = run(todo, map1, map2, args.threads)
+    print(f"undistorted {done} images in {duration:0.2f}s: {done/duration:0.1f} fps ({failed} failed)")
+
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import argparse
 import functools, itertools
-import sys, io
+import sys
 import time
 
 import gi
@@ -12,36 +12,26 @@ from gi.repository import GLib, Gst, GstApp
 import cv2
 from PIL import Image
 
+from callib import sources
+from callib.frames import pull_samples, mapped_frames
+from callib.framebuffer import Framebuffer
 
-def build_pipeline(fps, hflip, vflip):
+
+def build_pipeline(fps, hflip, vflip, backend='argus', location=None):
     # initialise the system
     Gst.init(sys.argv)
     
     # hard coded for now
     camera_mode, cam_width, cam_height = 2, 1920, 1080
     
-    # build the pipeline
+    # build the pipeline, the source is the camera or one of the stand-ins for it
     nodes = []
     
-    node = Gst.ElementFactory.make('nvarguscamerasrc')
+    node = sources.make_source(backend, camera_mode, 0, location, fps)
     nodes.append(node)
-    Gst.util_set_object_arg(node, "sensor-id", "0")
-    Gst.util_set_object_arg(node, "bufapi-version", "true")
-    Gst.util_set_object_arg(node, "sensor-mode", f"{camera_mode}")
-    
-    node = Gst.ElementFactory.make('capsfilter')
-    nodes.append(node)
-    Gst.util_set_object_arg(node, "caps", f"video/x-raw(memory:NVMM), framerate=(fraction){fps}/1")
 
-    node = Gst.ElementFactory.make('nvvideoconvert')
+    node = sources.make_convert(backend, sources.flip_method(hflip, vflip))
     nodes.append(node)
-    
-    if hflip and vflip:
-        Gst.util_set_object_arg(node, "flip-method", "2")
-    elif hflip:
-        Gst.util_set_object_arg(node, "flip-method", "4")
-    elif vflip:
-        Gst.util_set_object_arg(node, "flip-method", "6")
         
     node = Gst.ElementFactory.make('capsfilter')
     nodes.append(node)
@@ -75,24 +65,15 @@ def loop(appsink, limit):
     if limit > 0:
         looper = functools.partial(range, limit)
 
-    with open("/dev/fb0", "wb") as fb:
-        for idx in looper():
-            # read an image sample
-            sample = appsink.pull_sample()
-            if sample is None:
-                raise RuntimeError("pipeline stopped")
-        
+    # the frames are written straight from the mapped buffers, without copying them first
+    frames = mapped_frames(pull_samples(appsink), 1920, 1080)
+
+    with Framebuffer("/dev/fb0") as fb:
+        for idx, (_, buffer, image) in zip(looper(), frames):
             if start is None:
                 start = time.time()
-
-            buffer = sample.get_buffer()
-            if buffer is None:
-                raise RuntimeError("sample has no buffer")
-        
-            data = buffer.extract_dup(0, buffer.get_size())
         
-            fb.seek(0, io.SEEK_SET)
-            fb.write(data)
+            fb.write(image)
     
     duration = time.time() - start
     print(f"run time: {duration:0.2f}")
@@ -118,10 +99,12 @@ def main():
     parser.add_argument('-r', '--fps', help='camera frame rate', type=int, default=30)
     parser.add_argument('--hflip', help='flip the image horizontally', action='store_true')
     parser.add_argument('--vflip', help='flip the image vertically', action='store_true')
+    parser.add_argument('--source', help='where the frames come from (default: argus, the camera)', choices=sources.BACKENDS, default='argus')
+    parser.add_argument('--location', help='the image directory or pattern, or the video file, for the dir and file sources', type=str, default=None)
     args = parser.parse_args()
     
         
-    pipe, appsink = build_pipeline(args.fps, args.hflip, args.vflip)
+    pipe, appsink = build_pipeline(args.fps, args.hflip, args.vflip, args.source, args.location)
     if pipe:
         run(pipe, appsink, args.limit)
 
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 import sys
 import argparse
-import configparser
 
 import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import GLib, Gst
 
 import callib
+from callib import sources
 
 
 def bus_cb(bus, message, loop):
@@ -23,17 +23,22 @@ def bus_cb(bus, message, loop):
     return True
 
 
-def build_pipeline(camera_mode, hflip, vflip, calfile):
+def build_pipeline(camera_mode, hflip, vflip, calfile, backend='argus', location=None, sink='autovideosink', cpu_dewarp=False):
     
     # extract the camera mode, width, and height from the calfile
     cal_width = cal_height = None
+    config = None
     if calfile is not None:
-        config = configparser.ConfigParser()
-        config.read(calfile)
-        cal_width = config['property']['output-width']
-        cal_height = config['property']['output-height']
+        # the calibration file helpers are with the camera model, which pulls in opencv and numpy
+        from callib.model import is_calibration, read_calconfig
+        config = read_calconfig(calfile)
+        # nvdewarper can only read its own config
+        cpu_dewarp = cpu_dewarp or is_calibration(calfile)
+    if config is not None:
+        cal_width = config['output-width']
+        cal_height = config['output-height']
         if camera_mode is None:
-            camera_mode = config['property'].get('camera-mode', None)
+            camera_mode = config.get('camera-mode', None)
 
     camera_mode, cam_width, cam_height = callib.size_for_mode(camera_mode)
     if cal_width is None or cal_height is None:
@@ -44,29 +49,30 @@ def build_pipeline(camera_mode, hflip, vflip, calfile):
     print(f"  -> cam res: {cam_width} {cam_height}")
     print(f"  -> cal res: {cal_width} {cal_height}")
 
-    # build the pipeline
+    # build the pipeline, the source is the camera or one of the stand-ins for it. the pipeline is split
+    #  into chains around a cpu dewarp stage
+    chains = []
     nodes = []    
     
-    node = Gst.ElementFactory.make('nvarguscamerasrc')
+    node = sources.make_source(backend, camera_mode, 0, location)
     nodes.append(node)
-    Gst.util_set_object_arg(node, "sensor-id", "0")
-    Gst.util_set_object_arg(node, "bufapi-version", "true")
-    Gst.util_set_object_arg(node, "sensor-mode", f"{camera_mode}")
-    
-    node = Gst.ElementFactory.make('capsfilter')
-    nodes.append(node)
-    Gst.util_set_object_arg(node, "caps", f"video/x-raw(memory:NVMM), width=(int){cam_width}, height=(int){cam_height}, format=(string)NV12")
 
-    node = Gst.ElementFactory.make('nvvideoconvert')
+    node = sources.make_convert(backend, sources.flip_method(hflip, vflip))
     nodes.append(node)
-    if hflip and vflip:
-        Gst.util_set_object_arg(node, "flip-method", "rotate-180")
-    elif hflip:
-        Gst.util_set_object_arg(node, "flip-method", "horizontal-flip")
-    elif vflip:
-        Gst.util_set_object_arg(node, "flip-method", "vertical-flip")
 
-    if calfile is not None:
+    if calfile is not None and (cpu_dewarp or not sources.is_device(backend)):
+        # nvdewarper needs the argus source and its config, otherwise the frames are dewarped on the cpu
+        node = Gst.ElementFactory.make('capsfilter')
+        nodes.append(node)
+        Gst.util_set_object_arg(node, "caps", f"video/x-raw, width=(int){cam_width}, height=(int){cam_height}, format=(string)BGRx")
+        
+        appsink, appsrc = sources.make_bridge_ends(cam_width, cam_height, callib.maxfps_for_mode(camera_mode))
+        nodes.append(appsink)
+        chains.append(nodes)
+        
+        nodes = [appsrc, sources.make_convert(backend)]
+    
+    elif calfile is not None:
         node = Gst.ElementFactory.make('capsfilter')
         nodes.append(node)
         Gst.util_set_object_arg(node, "caps", f"video/x-raw(memory:NVMM), width=(int){cal_width}, height=(int){cal_height}, format=(string)RGBA")
@@ -77,27 +83,30 @@ def build_pipeline(camera_mode, hflip, vflip, calfile):
         Gst.util_set_object_arg(node, "source-id", "6")
         Gst.util_set_object_arg(node, "num-batch-buffers", "1")
 
-    node = Gst.ElementFactory.make('autovideosink')
+    node = Gst.ElementFactory.make(sink)
     nodes.append(node)
+    chains.append(nodes)
 
     pipe = Gst.Pipeline.new('viewer')
-    for node in nodes:
-        pipe.add(node)
     
     print("Display Pipeline")
-    for n0, n1 in zip(nodes, nodes[1:]):
-        print(f"  -> {n0.name}: {len(n0.sinkpads)} {len(n0.srcpads)}")
-        r = n0.link(n1)
-        if r == False:
-            print(f"failed to link nodes {n0.name} and {n1.name}")
-            return None
-
-    print(f"  -> {n1.name}: {len(n1.sinkpads)} {len(n1.srcpads)}")
+    for nodes in chains:
+        for node in nodes:
+            pipe.add(node)
+        
+        for n0, n1 in zip(nodes, nodes[1:]):
+            print(f"  -> {n0.name}: {len(n0.sinkpads)} {len(n0.srcpads)}")
+            r = n0.link(n1)
+            if r == False:
+                print(f"failed to link nodes {n0.name} and {n1.name}")
+                return None
+
+        print(f"  -> {n1.name}: {len(n1.sinkpads)} {len(n1.srcpads)}")
     
     return pipe
 
 
-def run_pipeline(pipe):
+def run_pipeline(pipe, bridge=None):
     
     bus = pipe.get_bus()
     bus.add_signal_watch()
@@ -107,11 +116,17 @@ def run_pipeline(pipe):
         bus.connect("message", bus_cb, loop)
         
         pipe.set_state(Gst.State.PLAYING)
+        if bridge is not None:
+            bridge.start()
         loop.run()
         
     except KeyboardInterrupt:
         pass
     
+    if bridge is not None:
+        bridge.close()
+        print(bridge.report())
+    
     pipe.set_state(Gst.State.NULL)
     pipe.get_state(Gst.CLOCK_TIME_NONE)
     
@@ -131,15 +146,30 @@ def main():
                             default=None,
                             help='the camera mode (default: 2)', 
                         )
-    parser.add_argument('calconfig', help='calibration config file', type=str, nargs='?', default=None)
+    parser.add_argument('--source', help='where the frames come from (default: argus, the camera)', choices=sources.BACKENDS, default='argus')
+    parser.add_argument('--location', help='the image directory or pattern, or the video file, for the dir and file sources', type=str, default=None)
+    parser.add_argument('--cpu-dewarp', help='undistort on the cpu with the remap tables instead of with nvdewarper', action='store_true')
+    parser.add_argument('--dewarp-threads', help='number of threads for the cpu dewarp', type=int, default=4)
+    parser.add_argument('calconfig', help='calibration config file, or cal-raw.xml or cal-model.npz for the cpu dewarp', type=str, nargs='?', default=None)
     args = parser.parse_args()
         
     # build and run the pipeline
-    pipe = build_pipeline(args.mode, args.hflip, args.vflip, args.calconfig)
+    pipe = build_pipeline(args.mode, args.hflip, args.vflip, args.calconfig, args.source, args.location, cpu_dewarp=args.cpu_dewarp)
     if pipe is None:
         return 1
     
-    return run_pipeline(pipe)
+    # the cpu dewarp loads the calibration saved alongside the config. it pulls in opencv and numpy,
+    #  so it's only imported when the pipeline has one
+    bridge = None
+    if sources.has_bridge(pipe):
+        from callib.bridge import make_dewarp_bridge
+        try:
+            bridge = make_dewarp_bridge(pipe, args.calconfig, args.dewarp_threads)
+        except (ValueError, FileNotFoundError) as e:
+            print(e)
+            return 1
+    
+    return run_pipeline(pipe, bridge)
     
 
 if __name__ == "__main__":